@@ -1,9 +1,16 @@
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
 from typing import Any, List, Optional, Tuple
 
 class BPlusNode:
+    __slots__ = ('leaf', 'keys', 'values', 'children', 'next')
+
     def __init__(self, leaf: bool = False):
         self.leaf = leaf
+        # Keys are kept in their own flat list (values live in a parallel list on
+        # leaves) so lookups can bisect the keys directly instead of walking tuples.
         self.keys: List[Any] = []
+        self.values: List[Any] = []
         self.children: List[BPlusNode] = []
         self.next: Optional[BPlusNode] = None
 
@@ -20,71 +27,161 @@ class BPlusTree:
             self.root = new_root
         self._insert_non_full(self.root, key, value)
 
+    def insert_many(self, items: List[Tuple[Any, Any]]):
+        # Inserting in key order keeps consecutive descents on the same path
+        for key, value in sorted(items, key=itemgetter(0)):
+            self.insert(key, value)
+
+    def bulk_load(self, items: List[Tuple[Any, Any]]):
+        """Insert (key, value) pairs that are already sorted by key.
+
+        An empty tree is built bottom-up in a single pass: leaves are filled
+        and chained left to right, then each internal level is built over the
+        one below it. A non-empty tree falls back to ordered inserts.
+        """
+        if self.root.keys or self.root.children:
+            for key, value in items:
+                self.insert(key, value)
+            return
+        if not items:
+            return
+
+        max_keys = (2 * self.order) - 1
+        level: List[BPlusNode] = []
+        lows: List[Any] = []
+        previous = None
+        for start, stop in self._chunk_bounds(len(items), max_keys):
+            leaf = BPlusNode(leaf=True)
+            leaf.keys = [key for key, _ in items[start:stop]]
+            leaf.values = [value for _, value in items[start:stop]]
+            if previous is not None:
+                previous.next = leaf
+            previous = leaf
+            level.append(leaf)
+            lows.append(leaf.keys[0])
+
+        while len(level) > 1:
+            parents: List[BPlusNode] = []
+            parent_lows: List[Any] = []
+            for start, stop in self._chunk_bounds(len(level), max_keys + 1):
+                parent = BPlusNode()
+                parent.children = level[start:stop]
+                parent.keys = lows[start + 1:stop]
+                parents.append(parent)
+                parent_lows.append(lows[start])
+            level, lows = parents, parent_lows
+        self.root = level[0]
+
+    @staticmethod
+    def _chunk_bounds(count: int, capacity: int) -> List[Tuple[int, int]]:
+        # Split count entries into the fewest chunks of at most capacity,
+        # spreading them evenly so no node is left nearly empty.
+        chunks = -(-count // capacity)
+        size, extra = divmod(count, chunks)
+        bounds = []
+        start = 0
+        for i in range(chunks):
+            stop = start + size + (1 if i < extra else 0)
+            bounds.append((start, stop))
+            start = stop
+        return bounds
+
     def _insert_non_full(self, node: BPlusNode, key: Any, value: Any):
-        i = len(node.keys) - 1
-        if node.leaf:
-            node.keys.append((None, None))
-            while i >= 0 and key < node.keys[i][0]:
-                node.keys[i + 1] = node.keys[i]
-                i -= 1
-            node.keys[i + 1] = (key, value)
-        else:
-            while i >= 0 and key < node.keys[i]:
-                i -= 1
-            i += 1
-            if len(node.children[i].keys) == (2 * self.order) - 1:
+        max_keys = (2 * self.order) - 1
+        while True:
+            keys = node.keys
+            # Document ids are handed out in increasing order, so most inserts land
+            # past the last key; check that bound before bisecting the whole node.
+            i = len(keys) if not keys or key >= keys[-1] else bisect_right(keys, key)
+            if node.leaf:
+                keys.insert(i, key)
+                node.values.insert(i, value)
+                return
+            if len(node.children[i].keys) == max_keys:
                 self._split_child(node, i)
-                if key > node.keys[i]:
+                if key >= keys[i]:
                     i += 1
-            self._insert_non_full(node.children[i], key, value)
+            node = node.children[i]
 
     def _split_child(self, parent: BPlusNode, index: int):
         order = self.order
         child = parent.children[index]
         new_child = BPlusNode(leaf=child.leaf)
 
-        parent.keys.insert(index, child.keys[order - 1])
-        parent.children.insert(index + 1, new_child)
-
-        new_child.keys = child.keys[order:]
-        child.keys = child.keys[:order - 1]
-
-        if not child.leaf:
-            new_child.children = child.children[order:]
-            child.children = child.children[:order]
-        else:
+        if child.leaf:
+            # Leaves keep every entry; the first key of the right half is copied up.
+            new_child.keys[:] = child.keys[order - 1:]
+            new_child.values[:] = child.values[order - 1:]
+            del child.keys[order - 1:]
+            del child.values[order - 1:]
+            separator = new_child.keys[0]
             new_child.next = child.next
             child.next = new_child
+        else:
+            separator = child.keys[order - 1]
+            new_child.keys[:] = child.keys[order:]
+            new_child.children[:] = child.children[order:]
+            del child.keys[order - 1:]
+            del child.children[order:]
+
+        parent.keys.insert(index, separator)
+        parent.children.insert(index + 1, new_child)
 
     def search(self, key: Any) -> Optional[Any]:
         return self._search(self.root, key)
 
     def _search(self, node: BPlusNode, key: Any) -> Optional[Any]:
-        i = 0
-        while i < len(node.keys) and key > node.keys[i][0]:
-            i += 1
-        if node.leaf:
-            if i < len(node.keys) and node.keys[i][0] == key:
-                return node.keys[i][1]
-            return None
-        return self._search(node.children[i], key)
+        leaf = self._find_leaf(node, key)
+        while leaf:
+            i = bisect_left(leaf.keys, key)
+            if i < len(leaf.keys):
+                return leaf.values[i] if leaf.keys[i] == key else None
+            # Duplicates of a separator key may start in the next leaf.
+            leaf = leaf.next
+        return None
 
     def range_query(self, start_key: Any, end_key: Any) -> List[Tuple[Any, Any]]:
         result = []
         leaf = self._find_leaf(self.root, start_key)
+        start = bisect_left(leaf.keys, start_key)
         while leaf:
-            for key, value in leaf.keys:
-                if start_key <= key <= end_key:
-                    result.append((key, value))
-                elif key > end_key:
-                    return result
+            keys = leaf.keys
+            # Only the last leaf of the range needs a bound check; every leaf
+            # before it is copied from the start position to its end in one slice.
+            if not keys or keys[-1] <= end_key:
+                result.extend(zip(keys[start:], leaf.values[start:]))
+            else:
+                stop = bisect_right(keys, end_key)
+                result.extend(zip(keys[start:stop], leaf.values[start:stop]))
+                return result
             leaf = leaf.next
+            start = 0
         return result
 
+    def delete(self, key: Any, value: Any = None) -> bool:
+        """Remove one entry for key, the one holding value when it is given.
+
+        The entry is dropped from its leaf without rebalancing. Separators in
+        the internal nodes remain valid bounds, so an underfull or empty leaf
+        only costs lookups a step along the leaf chain.
+        """
+        leaf = self._find_leaf(self.root, key)
+        while leaf:
+            keys = leaf.keys
+            i = bisect_left(keys, key)
+            while i < len(keys) and keys[i] == key:
+                if value is None or leaf.values[i] == value:
+                    del keys[i]
+                    del leaf.values[i]
+                    return True
+                i += 1
+            if i < len(keys):
+                return False
+            leaf = leaf.next
+        return False
+
     def _find_leaf(self, node: BPlusNode, key: Any) -> BPlusNode:
-        if node.leaf:
-            return node
-        i = 0
-        while i < len(node.keys) and key > node.keys[i]:
-            i += 1
-        return self._find_leaf(node.children[i], key)
+        # Descend to the leftmost leaf that can hold key so duplicates are not skipped.
+        while not node.leaf:
+            node = node.children[bisect_left(node.keys, key)]
+        return node
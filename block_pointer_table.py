@@ -1,50 +1,64 @@
+from array import array
 from typing import List, Tuple, Optional
 import asyncio
 
 class BlockPointerTable:
+    LOCK_STRIPES = 64
+
     def __init__(self):
-        self.entries: List[List[Tuple[int, int]]] = []
+        # Each pointer is packed into one unsigned 64-bit word: the record location
+        # in the high 62 bits and the block store id (0-2) in the low 2 bits.
+        self.entries: List[array] = []
         self.indirect_entries: List[List[int]] = []
-        self.lock = asyncio.Lock()
+        # Writers to different entries only contend when they hash to the same
+        # stripe; creating entries (which grows the tables) has its own lock.
+        self.locks = [asyncio.Lock() for _ in range(self.LOCK_STRIPES)]
+        self.create_lock = asyncio.Lock()
+
+    def _lock(self, entry_id: int) -> asyncio.Lock:
+        return self.locks[entry_id & (self.LOCK_STRIPES - 1)]
 
     async def create_entry(self) -> int:
-        async with self.lock:
-            self.entries.append([])
-            self.indirect_entries.append([])
-            return len(self.entries) - 1
+        async with self.create_lock:
+            return self._create_entry()
+
+    def _create_entry(self) -> int:
+        self.entries.append(array('Q'))
+        self.indirect_entries.append([])
+        return len(self.entries) - 1
 
     async def add_pointer(self, entry_id: int, block_store_id: int, record_location: int):
-        async with self.lock:
+        async with self._lock(entry_id):
             if entry_id >= len(self.entries):
                 raise ValueError(f"Invalid entry_id: {entry_id}")
-            
-            entry = self.entries[entry_id]
-            if len(entry) < 16:
-                entry.append((block_store_id, record_location))
-            else:
+
+            target = entry_id
+            if len(self.entries[entry_id]) >= 16:
                 indirect_entry = self.indirect_entries[entry_id]
-                if not indirect_entry:
-                    indirect_entry.append(await self.create_entry())
-                last_indirect = self.entries[indirect_entry[-1]]
-                if len(last_indirect) == 16:
-                    new_indirect = await self.create_entry()
-                    indirect_entry.append(new_indirect)
-                    last_indirect = self.entries[new_indirect]
-                last_indirect.append((block_store_id, record_location))
+                if not indirect_entry or len(self.entries[indirect_entry[-1]]) == 16:
+                    indirect_entry.append(self._create_entry())
+                target = indirect_entry[-1]
+            self.entries[target].append((record_location << 2) | (block_store_id & 3))
+
+    async def get_packed_pointers(self, entry_id: int) -> array:
+        # Readers take no lock: entries only ever grow by appends, which never
+        # leave an array in a partially updated state.
+        if entry_id >= len(self.entries):
+            raise ValueError(f"Invalid entry_id: {entry_id}")
+
+        result = array('Q', self.entries[entry_id])
+        for indirect_id in self.indirect_entries[entry_id]:
+            result.extend(self.entries[indirect_id])
+        return result
 
     async def get_pointers(self, entry_id: int) -> List[Tuple[int, int]]:
-        async with self.lock:
-            if entry_id >= len(self.entries):
-                raise ValueError(f"Invalid entry_id: {entry_id}")
-            
-            result = self.entries[entry_id].copy()
-            for indirect_id in self.indirect_entries[entry_id]:
-                result.extend(self.entries[indirect_id])
-            return result
+        return [(pointer & 3, pointer >> 2) for pointer in await self.get_packed_pointers(entry_id)]
+
+    async def get_locations(self, entry_id: int) -> List[int]:
+        return [pointer >> 2 for pointer in await self.get_packed_pointers(entry_id)]
 
     async def get_indirect_pointers(self, entry_id: int) -> Optional[List[int]]:
-        async with self.lock:
-            if entry_id >= len(self.indirect_entries):
-                raise ValueError(f"Invalid entry_id: {entry_id}")
-            
-            return self.indirect_entries[entry_id] if self.indirect_entries[entry_id] else None
+        if entry_id >= len(self.indirect_entries):
+            raise ValueError(f"Invalid entry_id: {entry_id}")
+
+        return self.indirect_entries[entry_id] if self.indirect_entries[entry_id] else None
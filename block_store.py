@@ -1,22 +1,36 @@
 import os
+import mmap
 import asyncio
-from typing import List
+import threading
+from typing import List, Optional, Tuple
 from logger import Logger
 from filestore_exceptions import *
 
 class BlockStore:
+    # The backing file grows by this many blocks at a time.
+    EXTENT_BLOCKS = 64
+
     def __init__(self, file_path: str, block_size: int):
         self.file_path = file_path
         self.block_size = block_size
-        self.free_blocks: List[int] = []
+        # One bit per block id, set while the block is free.
+        self.free_bitmap = bytearray()
+        self._free_hint = 0  # No byte below this index has a free bit set
         self.logger = Logger.get_logger()
+        self._fd = -1
+        self._mapped: Optional[memoryview] = None
+        self._alloc_lock = threading.Lock()
         self._ensure_file_exists()
+        # close() trims the preallocated tail, so after a clean shutdown the
+        # file size is the allocation high-water mark
+        self._capacity = os.fstat(self._fd).st_size // block_size
+        self._next_block = self._capacity
 
     def _ensure_file_exists(self):
         try:
-            if not os.path.exists(self.file_path):
-                with open(self.file_path, 'wb') as f:
-                    pass  # Create an empty file
+            # A single descriptor is kept open for the life of the store; all block
+            # I/O goes through pread/pwrite on it, so no per-call open/seek/close.
+            self._fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o644)
             self.logger.info(f"Ensured file exists: {self.file_path}")
         except IOError as e:
             raise StorageException(f"Error ensuring file exists {self.file_path}: {str(e)}")
@@ -30,21 +44,59 @@ class BlockStore:
             raise BlockAllocationError(f"Error allocating block: {str(e)}")
 
     def _allocate_block_sync(self) -> int:
-        if self.free_blocks:
-            block_id = self.free_blocks.pop()
-            self.logger.info(f"Allocated existing block: {block_id}")
-            return block_id
-        else:
+        with self._alloc_lock:
+            block_id = self._pop_free_block()
+            if block_id is not None:
+                self.logger.info("Allocated existing block: %s", block_id)
+                return block_id
             try:
-                with open(self.file_path, 'ab') as f:
-                    f.seek(0, 2)  # Move to the end of the file
-                    block_id = f.tell() // self.block_size
-                    f.write(b'\0' * self.block_size)
-                self.logger.info(f"Allocated new block: {block_id}")
+                if self._next_block == self._capacity:
+                    os.ftruncate(self._fd, (self._capacity + self.EXTENT_BLOCKS) * self.block_size)
+                    self._capacity += self.EXTENT_BLOCKS
+                block_id = self._next_block
+                self._next_block += 1
+                self.logger.info("Allocated new block: %s", block_id)
                 return block_id
-            except IOError as e:
+            except OSError as e:
                 raise BlockAllocationError(f"IO error allocating new block: {str(e)}")
 
+    async def allocate_blocks(self, count: int) -> List[int]:
+        try:
+            return await asyncio.to_thread(self._allocate_blocks_sync, count)
+        except Exception as e:
+            raise BlockAllocationError(f"Error allocating {count} blocks: {str(e)}")
+
+    def _allocate_blocks_sync(self, count: int) -> List[int]:
+        # Multi-block allocations are carved from the end of the file as one
+        # contiguous run (so they can be read and written back with one syscall);
+        # a single block may still reuse a freed one.
+        if count == 1:
+            return [self._allocate_block_sync()]
+        with self._alloc_lock:
+            try:
+                first = self._next_block
+                if first + count > self._capacity:
+                    extents = -(-(first + count - self._capacity) // self.EXTENT_BLOCKS)
+                    os.ftruncate(self._fd, (self._capacity + extents * self.EXTENT_BLOCKS) * self.block_size)
+                    self._capacity += extents * self.EXTENT_BLOCKS
+                self._next_block += count
+                self.logger.info("Allocated new blocks: %s-%s", first, first + count - 1)
+                return list(range(first, first + count))
+            except OSError as e:
+                raise BlockAllocationError(f"IO error allocating {count} new blocks: {str(e)}")
+
+    def _pop_free_block(self) -> Optional[int]:
+        bitmap = self.free_bitmap
+        for i in range(self._free_hint, len(bitmap)):
+            byte = bitmap[i]
+            if byte:
+                bit = (byte & -byte).bit_length() - 1
+                bitmap[i] = byte & ~(1 << bit)
+                self._free_hint = i
+                return i * 8 + bit
+        self._free_hint = len(bitmap)
+        return None
+
     async def write_block(self, block_id: int, data: bytes):
         try:
             await asyncio.to_thread(self._write_block_sync, block_id, data)
@@ -53,27 +105,95 @@ class BlockStore:
 
     def _write_block_sync(self, block_id: int, data: bytes):
         try:
-            with open(self.file_path, 'r+b') as f:
-                f.seek(block_id * self.block_size)
-                f.write(data.ljust(self.block_size, b'\0'))
-            self.logger.info(f"Written block {block_id}")
-        except IOError as e:
+            os.pwrite(self._fd, data.ljust(self.block_size, b'\0'), block_id * self.block_size)
+            self.logger.info("Written block %s", block_id)
+        except OSError as e:
             raise BlockWriteError(f"IO error writing block {block_id}: {str(e)}")
 
-    async def read_block(self, block_id: int) -> bytes:
+    def _view(self, offset: int, length: int) -> memoryview:
+        # Reads are served from a read-only mapping of the file. Writes go through
+        # pwrite on the same descriptor and are visible through the shared mapping;
+        # when the file has grown past the mapping it is simply mapped again (views
+        # handed out earlier keep the old mapping alive until they are dropped).
+        mapped = self._mapped
+        if mapped is None or offset + length > len(mapped):
+            size = os.fstat(self._fd).st_size
+            if not size:
+                return memoryview(b'')
+            if mapped is None or size > len(mapped):
+                mapped = self._mapped = memoryview(mmap.mmap(self._fd, size, access=mmap.ACCESS_READ))
+        return mapped[offset:offset + length]
+
+    async def read_block(self, block_id: int) -> memoryview:
         try:
             return await asyncio.to_thread(self._read_block_sync, block_id)
         except Exception as e:
             raise BlockReadError(f"Error reading block {block_id}: {str(e)}")
 
-    def _read_block_sync(self, block_id: int) -> bytes:
+    def _read_block_sync(self, block_id: int) -> memoryview:
         try:
-            with open(self.file_path, 'rb') as f:
-                f.seek(block_id * self.block_size)
-                return f.read(self.block_size)
-        except IOError as e:
+            return self._view(block_id * self.block_size, self.block_size)
+        except (OSError, ValueError) as e:
             raise BlockReadError(f"IO error reading block {block_id}: {str(e)}")
 
+    async def read_extents(self, block_ids: List[int], size: Optional[int] = None) -> bytearray:
+        try:
+            return await asyncio.to_thread(self._read_extents_sync, block_ids, size)
+        except Exception as e:
+            raise BlockReadError(f"Error reading blocks {block_ids}: {str(e)}")
+
+    def _read_extents_sync(self, block_ids: List[int], size: Optional[int] = None) -> bytearray:
+        # Blocks are copied in the given order straight from the mapping into one
+        # preallocated buffer, one slice per run of consecutive block ids. When size
+        # is given the block padding past the payload is never copied.
+        try:
+            total = len(block_ids) * self.block_size
+            if size is not None:
+                total = min(size, total)
+            buf = bytearray(total)
+            view = memoryview(buf)
+            offset = 0
+            i = 0
+            while offset < total:
+                first = block_ids[i]
+                count = 1
+                while i + count < len(block_ids) and block_ids[i + count] == first + count:
+                    count += 1
+                length = min(count * self.block_size, total - offset)
+                source = self._view(first * self.block_size, length)
+                if len(source) < length:
+                    raise BlockReadError(f"Short read at block {first}: {len(source)} of {length} bytes")
+                view[offset:offset + length] = source
+                offset += length
+                i += count
+            return buf
+        except (OSError, ValueError) as e:
+            raise BlockReadError(f"IO error reading blocks {block_ids}: {str(e)}")
+
+    async def write_blocks(self, blocks: List[Tuple[int, bytes]]):
+        try:
+            await asyncio.to_thread(self._write_blocks_sync, blocks)
+        except Exception as e:
+            raise BlockWriteError(f"Error writing {len(blocks)} blocks: {str(e)}")
+
+    def _write_blocks_sync(self, blocks: List[Tuple[int, bytes]]):
+        # Each run of consecutive block ids goes out in a single pwritev.
+        try:
+            block_size = self.block_size
+            i = 0
+            while i < len(blocks):
+                first = blocks[i][0]
+                count = 1
+                while i + count < len(blocks) and blocks[i + count][0] == first + count:
+                    count += 1
+                buffers = [data if len(data) == block_size else bytes(data).ljust(block_size, b'\0')
+                           for _, data in blocks[i:i + count]]
+                os.pwritev(self._fd, buffers, first * block_size)
+                i += count
+            self.logger.info("Written %s blocks", len(blocks))
+        except OSError as e:
+            raise BlockWriteError(f"IO error writing {len(blocks)} blocks: {str(e)}")
+
     async def free_block(self, block_id: int):
         try:
             await asyncio.to_thread(self._free_block_sync, block_id)
@@ -81,8 +201,29 @@ class BlockStore:
             raise StorageException(f"Error freeing block {block_id}: {str(e)}")
 
     def _free_block_sync(self, block_id: int):
-        self.free_blocks.append(block_id)
-        self.logger.info(f"Freed block {block_id}")
+        index = block_id >> 3
+        with self._alloc_lock:
+            if index >= len(self.free_bitmap):
+                self.free_bitmap.extend(bytes(index + 1 - len(self.free_bitmap)))
+            self.free_bitmap[index] |= 1 << (block_id & 7)
+            self._free_hint = min(self._free_hint, index)
+        self.logger.info("Freed block %s", block_id)
+
+    def close(self):
+        self._mapped = None
+        if self._fd >= 0:
+            with self._alloc_lock:
+                if self._capacity > self._next_block:
+                    os.ftruncate(self._fd, self._next_block * self.block_size)
+                    self._capacity = self._next_block
+            os.close(self._fd)
+            self._fd = -1
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
 
 class SmallBlockStore(BlockStore):
     def __init__(self, file_path: str):
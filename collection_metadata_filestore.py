@@ -1,23 +1,40 @@
 import time
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, List, Callable
 from json_filestore import JSONFilestore
 from schema import Schema, create_schema
 from filestore_exceptions import *
 
 class CollectionMetadataFilestore(JSONFilestore):
+    def __init__(self, filename: str, cache_capacity: int = 100):
+        super().__init__(filename, cache_capacity)
+        # Compiled Schema objects by collection id; dropped whenever the
+        # collection is updated or deleted.
+        self._schema_cache: Dict[int, Schema] = {}
+        self._invalidation_listeners: List[Callable[[int], None]] = []
+
+    def add_invalidation_listener(self, listener: Callable[[int], None]):
+        """Register a callback invoked with a collection id whenever that collection changes."""
+        self._invalidation_listeners.append(listener)
+
+    def _invalidate(self, collection_id: int):
+        self._schema_cache.pop(collection_id, None)
+        for listener in self._invalidation_listeners:
+            listener(collection_id)
+
     async def create_collection(self, name: str, schema_definition: Optional[Dict[str, Dict[str, Any]]] = None, 
                                 foreign_keys: Optional[Dict[str, Tuple[str, str]]] = None, 
                                 enforce_schema: bool = True) -> int:
         try:
             schema = create_schema(schema_definition, foreign_keys) if schema_definition else None
+            now = int(time.time())
             collection = {
                 "name": name,
                 "schema": schema_definition,
                 "foreign_keys": foreign_keys,
                 "enforce_schema": enforce_schema,
                 "document_count": 0,
-                "created_at": int(time.time()),
-                "updated_at": int(time.time())
+                "created_at": now,
+                "updated_at": now
             }
             collection_id = await self.create(collection)
             self.logger.info(f"Created collection: {name} (ID: {collection_id})")
@@ -46,6 +63,7 @@ class CollectionMetadataFilestore(JSONFilestore):
             collection.update(updates)
             collection["updated_at"] = int(time.time())
             success = await self.update(collection_id, collection)
+            self._invalidate(collection_id)
             if success:
                 self.logger.info(f"Updated collection: {collection_id}")
             return success
@@ -57,6 +75,7 @@ class CollectionMetadataFilestore(JSONFilestore):
     async def delete_collection(self, collection_id: int) -> bool:
         try:
             success = await self.delete(collection_id)
+            self._invalidate(collection_id)
             if success:
                 self.logger.info(f"Deleted collection: {collection_id}")
             return success
@@ -65,17 +84,26 @@ class CollectionMetadataFilestore(JSONFilestore):
         except Exception as e:
             raise CollectionException(f"Failed to delete collection {collection_id}: {str(e)}")
 
-    async def validate_document(self, collection_id: int, document: Dict[str, Any], filestore) -> bool:
+    async def validate_document(self, collection_id: int, document: Dict[str, Any], filestore,
+                                collection: Optional[Dict[str, Any]] = None) -> bool:
         try:
-            collection = await self.get_collection(collection_id)
+            if collection is None:
+                collection = await self.get_collection(collection_id)
             if not collection["enforce_schema"]:
                 return True  # Schema-less mode, no validation needed
             
             if not collection["schema"]:
                 return True  # No schema defined, considered valid
             
-            schema = create_schema(collection["schema"], collection.get("foreign_keys"))
-            if not await schema.validate(document, filestore):
+            schema = self._schema_cache.get(collection_id)
+            if schema is None:
+                schema = create_schema(collection["schema"], collection.get("foreign_keys"))
+                self._schema_cache[collection_id] = schema
+            if schema.needs_filestore:
+                valid = await schema.validate(document, filestore)
+            else:
+                valid = schema.validate_local(document)
+            if not valid:
                 raise DocumentValidationError("Document does not match collection schema")
             return True
         except CollectionNotFoundError:
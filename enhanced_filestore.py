@@ -1,10 +1,11 @@
 import json
 import asyncio
-from typing import Dict, Any, List, Optional, Tuple, Set
+from typing import Dict, Any, List, Optional, Tuple, Set, Callable
 from json_filestore import JSONFilestore
 from collection_metadata_filestore import CollectionMetadataFilestore
-from block_store import SmallBlockStore, MediumBlockStore, LargeBlockStore
+from block_store import BlockStore, SmallBlockStore, MediumBlockStore, LargeBlockStore
 from block_pointer_table import BlockPointerTable
+from lru_cache import LRUCache
 from index_manager import IndexManager, IndexManagerConfig
 from journal import Journal
 from logger import Logger
@@ -12,6 +13,17 @@ from filestore_maintenance import FileStoreMaintenance
 from transaction import TransactionManager
 from filestore_exceptions import *
 from transaction_types import OperationType, Operation
+from query_predicate import Predicate, FieldEq, And, Or
+import serialization
+
+# Schema types whose fields get a B+ tree index, mapped to the Python types an
+# indexed value may have; values of one field must all order against each other.
+_INDEXED_FIELD_TYPES = {
+    'string': str,
+    'integer': int,
+    'float': (int, float),
+    'boolean': bool,
+}
 
 class EnhancedFilestore:
     def __init__(self, base_path: str, index_config: Dict[str, Any], doc_cache_capacity: int = 1000, collection_cache_capacity: int = 100):
@@ -19,9 +31,17 @@ class EnhancedFilestore:
             self.base_path = base_path
             self.document_store = JSONFilestore(f"{base_path}/documents.json", doc_cache_capacity)
             self.collection_store = CollectionMetadataFilestore(f"{base_path}/collections.json", collection_cache_capacity)
+            self._collection_cache = LRUCache(collection_cache_capacity)
+            self.collection_store.add_invalidation_listener(self._collection_cache.invalidate)
             self.small_block_store = SmallBlockStore(f"{base_path}/small_blocks.bin")
             self.medium_block_store = MediumBlockStore(f"{base_path}/medium_blocks.bin")
             self.large_block_store = LargeBlockStore(f"{base_path}/large_blocks.bin")
+            # (max document size, store, store id), checked in order
+            self._store_table = (
+                (4 * 1024, self.small_block_store, 0),  # 4 KB
+                (64 * 1024, self.medium_block_store, 1),  # 64 KB
+                (float('inf'), self.large_block_store, 2),
+            )
             self.block_pointer_table = BlockPointerTable()
             self.index_manager = IndexManager(IndexManagerConfig(index_config))
             self.journal = Journal(f"{base_path}/journal.log")
@@ -39,8 +59,8 @@ class EnhancedFilestore:
         try:
             collection_id = await self.collection_store.create_collection(name, schema_definition, foreign_keys, enforce_schema)
             if schema_definition and enforce_schema:
-                for field in schema_definition:
-                    await self.index_manager.create_index(f"{name}_{field}")
+                self.index_manager.create_indexes([f"{name}_{field}" for field, props in schema_definition.items()
+                                                   if props.get('type', 'string') in _INDEXED_FIELD_TYPES])
             self.logger.info(f"Created collection: {name} (Schema enforced: {enforce_schema})")
             return collection_id
         except CollectionAlreadyExistsError:
@@ -53,13 +73,14 @@ class EnhancedFilestore:
     async def add_document(self, collection_id: int, data: Dict[str, Any]) -> int:
         transaction = await self.transaction_manager.start_transaction()
         try:
-            collection = await self.collection_store.get_collection(collection_id)
+            collection = await self._get_collection(collection_id)
             if collection["enforce_schema"]:
-                if not await self.collection_store.validate_document(collection_id, data, self):
+                if not await self.collection_store.validate_document(collection_id, data, self, collection):
                     raise DocumentValidationError("Document does not match collection schema")
             
             doc_id = await self._add_document(transaction, collection_id, data)
             await self.transaction_manager.run_transaction(transaction)
+            await self._reindex_fields(collection, doc_id, None, data)
             self.logger.info(f"Added document {doc_id} to collection {collection_id}")
             return doc_id
         except CollectionNotFoundError:
@@ -77,14 +98,12 @@ class EnhancedFilestore:
             if not doc_metadata:
                 raise DocumentNotFoundError(f"Document with id {doc_id} not found")
 
-            block_store, _ = await self._select_block_store(doc_metadata["size"])
-            pointers = await self.block_pointer_table.get_pointers(doc_metadata["block_pointer"])
+            block_store, _ = self._select_block_store(doc_metadata["size"])
+            blocks = await self.block_pointer_table.get_locations(doc_metadata["block_pointer"])
 
-            data = b""
-            for _, block in pointers:
-                data += await self._read_block(block_store, block)
+            data = await self._read_extents(block_store, blocks, doc_metadata["size"])
 
-            return json.loads(data.decode('utf-8'))
+            return serialization.loads(data)
         except DocumentNotFoundError:
             raise
         except json.JSONDecodeError:
@@ -100,13 +119,14 @@ class EnhancedFilestore:
                 raise DocumentNotFoundError(f"Document with id {doc_id} not found")
             
             collection_id = old_doc["collection_id"]
-            collection = await self.collection_store.get_collection(collection_id)
+            collection = await self._get_collection(collection_id)
             if collection["enforce_schema"]:
-                if not await self.collection_store.validate_document(collection_id, data, self):
+                if not await self.collection_store.validate_document(collection_id, data, self, collection):
                     raise DocumentValidationError("Updated document does not match collection schema")
             
             success = await self._update_document(transaction, doc_id, data)
             await self.transaction_manager.run_transaction(transaction)
+            await self._reindex_fields(collection, doc_id, old_doc, data)
             self.logger.info(f"Updated document {doc_id}")
             return success
         except DocumentNotFoundError:
@@ -125,8 +145,12 @@ class EnhancedFilestore:
             if not doc_metadata:
                 raise DocumentNotFoundError(f"Document with id {doc_id} not found")
 
+            collection = await self._get_collection(doc_metadata["collection_id"])
+            old_doc = await self.get_document(doc_id) if self._field_indexes(collection) else None
             success = await self._delete_document(transaction, doc_id)
             await self.transaction_manager.run_transaction(transaction)
+            if old_doc is not None:
+                await self._reindex_fields(collection, doc_id, old_doc, None)
             self.logger.info(f"Deleted document {doc_id}")
             return success
         except DocumentNotFoundError:
@@ -145,25 +169,137 @@ class EnhancedFilestore:
         except Exception as e:
             raise QueryException(f"Error querying documents in collection {collection_id}: {str(e)}")
 
+    async def query(self, collection_id: int, predicate: Predicate,
+                    filter_func: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Dict[str, Any]]:
+        try:
+            collection = await self._get_collection(collection_id)
+            # Queued index writes have not landed yet, so the indexes may lag the store
+            if self.index_manager.async_update_queue:
+                candidates = None
+            else:
+                candidates = await self._index_candidates(collection, predicate)
+            if candidates is None:
+                # Some part of the predicate is not covered by an index
+                documents = await self.document_store.query_by_collection_id(collection_id)
+            else:
+                documents = []
+                for doc_id in sorted(candidates):
+                    try:
+                        document = await self.document_store.read(doc_id)
+                    except DocumentNotFoundError:
+                        continue
+                    if document.get('collection_id') == collection_id:
+                        documents.append(document)
+
+            return [doc for doc in documents
+                    if predicate.matches(doc) and (filter_func is None or filter_func(doc))]
+        except CollectionNotFoundError:
+            raise
+        except Exception as e:
+            raise QueryException(f"Error querying documents in collection {collection_id}: {str(e)}")
+
+    async def _index_candidates(self, collection: Dict[str, Any], predicate: Predicate) -> Optional[Set[int]]:
+        # Returns a superset of the matching doc ids using the collection's field
+        # indexes, or None when the predicate cannot be answered from indexes alone.
+        if isinstance(predicate, FieldEq):
+            index = self._field_index(collection, predicate.field)
+            # Documents without the field are never indexed, and a value of another
+            # type cannot be compared with the keys; the scan handles both
+            if index is None or not isinstance(predicate.value, index[1]):
+                return None
+            try:
+                entries = await self.index_manager.range_query(index[0], predicate.value, predicate.value)
+            except QueryException:
+                # range_query wraps the TypeError of keys that still fail to compare
+                return None
+            return {doc_id for _, doc_id in entries}
+        if isinstance(predicate, And):
+            result = None
+            for child in predicate.predicates:
+                candidates = await self._index_candidates(collection, child)
+                if candidates is not None:
+                    result = candidates if result is None else result & candidates
+            return result
+        if isinstance(predicate, Or):
+            result = set()
+            for child in predicate.predicates:
+                candidates = await self._index_candidates(collection, child)
+                if candidates is None:
+                    return None
+                result |= candidates
+            return result
+        return None
+
+    def _field_index(self, collection: Dict[str, Any], field: str) -> Optional[Tuple[str, Any]]:
+        # (index name, allowed key types) for an indexed field, else None
+        props = (collection.get("schema") or {}).get(field)
+        if props is None:
+            return None
+        key_types = _INDEXED_FIELD_TYPES.get(props.get('type', 'string'))
+        index_name = f"{collection['name']}_{field}"
+        if key_types is None or index_name not in self.index_manager.indexes:
+            return None
+        return index_name, key_types
+
+    def _field_indexes(self, collection: Dict[str, Any]) -> List[Tuple[str, str, Any]]:
+        indexes = []
+        for field in collection.get("schema") or ():
+            index = self._field_index(collection, field)
+            if index is not None:
+                indexes.append((field, *index))
+        return indexes
+
+    async def _reindex_fields(self, collection: Dict[str, Any], doc_id: int,
+                              old_data: Optional[Dict[str, Any]], new_data: Optional[Dict[str, Any]]):
+        # Brings the collection's field indexes in line with a committed write;
+        # old_data is None for an add and new_data is None for a delete.
+        for field, index_name, key_types in self._field_indexes(collection):
+            old_value = old_data.get(field) if old_data else None
+            new_value = new_data.get(field) if new_data else None
+            if old_value == new_value:
+                continue
+            try:
+                if old_value is not None:
+                    await self.index_manager.delete(index_name, old_value, doc_id)
+                if new_value is not None:
+                    if not isinstance(new_value, key_types):
+                        raise TypeError(f"{type(new_value).__name__} value for field {field}")
+                    await self.index_manager.insert(index_name, new_value, doc_id)
+            except Exception as e:
+                # The write has committed and must not fail here; an index that
+                # missed it is dropped so queries on the field scan instead
+                self.index_manager.drop_index(index_name)
+                self.logger.warning(f"Dropped index {index_name} after failing to index document {doc_id}: {str(e)}")
+
     async def atomic_transaction_execute(self, operations: List[Operation]) -> List[Tuple[bool, Optional[int]]]:
-        transaction = await self.transaction_manager.start_transaction()
+        transaction = await self.transaction_manager.start_transaction(len(operations))
         results = []
+        # (collection id, doc id, old data, new data) applied to the field indexes after commit
+        reindex = []
 
         try:
             for operation in operations:
                 if operation.type == OperationType.ADD:
                     doc_id = await self._add_document(transaction, operation.collection_id, operation.data)
                     results.append((True, doc_id))
+                    reindex.append((operation.collection_id, doc_id, None, operation.data))
                 elif operation.type == OperationType.UPDATE:
+                    old_doc = await self.get_document(operation.doc_id)
                     success = await self._update_document(transaction, operation.doc_id, operation.data)
                     results.append((success, operation.doc_id))
+                    reindex.append((old_doc["collection_id"], operation.doc_id, old_doc, operation.data))
                 elif operation.type == OperationType.DELETE:
+                    old_doc = await self.get_document(operation.doc_id)
                     success = await self._delete_document(transaction, operation.doc_id)
                     results.append((success, operation.doc_id))
+                    reindex.append((old_doc["collection_id"], operation.doc_id, old_doc, None))
                 else:
                     raise ValueError(f"Unknown operation type: {operation.type}")
 
             await self.transaction_manager.run_transaction(transaction)
+            for collection_id, doc_id, old_data, new_data in reindex:
+                collection = await self._get_collection(collection_id)
+                await self._reindex_fields(collection, doc_id, old_data, new_data)
             self.logger.info(f"Atomic transaction executed successfully with {len(operations)} operations")
             return results
 
@@ -176,21 +312,39 @@ class EnhancedFilestore:
 
     # ... (other methods with similar error handling)
 
-    async def _select_block_store(self, size: int) -> Tuple[BlockStore, int]:
-        if size <= 4 * 1024:  # 4 KB
-            return self.small_block_store, 0
-        elif size <= 64 * 1024:  # 64 KB
-            return self.medium_block_store, 1
-        else:
-            return self.large_block_store, 2
+    async def close(self):
+        try:
+            await self.transaction_manager.close()
+            await self.journal.close()
+            for _, block_store, _ in self._store_table:
+                block_store.close()
+        except Exception as e:
+            raise StorageException(f"Error closing filestore: {str(e)}")
+
+    async def _get_collection(self, collection_id: int) -> Dict[str, Any]:
+        # Collection metadata is read on every write; the collection store
+        # invalidates this cache whenever a collection is updated or deleted.
+        collection = self._collection_cache.get(collection_id)
+        if collection is None:
+            collection = await self.collection_store.get_collection(collection_id)
+            self._collection_cache.put(collection_id, collection)
+        return collection
+
+    def _select_block_store(self, size: int) -> Tuple[BlockStore, int]:
+        for max_size, block_store, store_id in self._store_table:
+            if size <= max_size:
+                return block_store, store_id
 
     async def _write_to_blocks(self, block_store, data: bytes) -> List[int]:
-        blocks = []
         try:
-            for i in range(0, len(data), block_store.block_size):
-                block = await self._allocate_block(block_store)
-                await self._write_block(block_store, block, data[i:i+block_store.block_size])
-                blocks.append(block)
+            block_size = block_store.block_size
+            count = -(-len(data) // block_size)
+            if not count:
+                return []
+            blocks = await self._allocate_blocks(block_store, count)
+            view = memoryview(data)
+            await self._write_blocks(block_store, [(block, view[i * block_size:(i + 1) * block_size])
+                                                   for i, block in enumerate(blocks)])
             return blocks
         except BlockAllocationError:
             raise
@@ -206,6 +360,13 @@ class EnhancedFilestore:
         except Exception as e:
             raise BlockAllocationError(f"Error allocating block: {str(e)}")
 
+    @staticmethod
+    async def _allocate_blocks(block_store, count):
+        try:
+            return await block_store.allocate_blocks(count)
+        except Exception as e:
+            raise BlockAllocationError(f"Error allocating blocks: {str(e)}")
+
     @staticmethod
     async def _write_block(block_store, block, data):
         try:
@@ -213,6 +374,13 @@ class EnhancedFilestore:
         except Exception as e:
             raise BlockWriteError(f"Error writing to block: {str(e)}")
 
+    @staticmethod
+    async def _write_blocks(block_store, blocks):
+        try:
+            await block_store.write_blocks(blocks)
+        except Exception as e:
+            raise BlockWriteError(f"Error writing to blocks: {str(e)}")
+
     @staticmethod
     async def _read_block(block_store, block):
         try:
@@ -220,6 +388,13 @@ class EnhancedFilestore:
         except Exception as e:
             raise BlockReadError(f"Error reading from block: {str(e)}")
 
+    @staticmethod
+    async def _read_extents(block_store, blocks, size=None):
+        try:
+            return await block_store.read_extents(blocks, size)
+        except Exception as e:
+            raise BlockReadError(f"Error reading from blocks: {str(e)}")
+
     @staticmethod
     async def _free_block(block_store, block):
         try:
@@ -37,13 +37,16 @@ class IndexAlreadyExistsError(IndexException):
 class IndexNotFoundError(IndexException):
     """Raised when an index is not found."""
 
+class QueryException(FilestoreException):
+    """Raised when there's an error executing a query."""
+
 class TransactionException(FilestoreException):
     """Base exception for transaction-related errors."""
 
 class TransactionAbortedError(TransactionException):
     """Raised when a transaction is aborted."""
 
-class DeadlockDetectedError(TransactionException):
+class DeadlockDetectedError(TransactionAbortedError):
     """Raised when a deadlock is detected."""
 
 class StorageException(FilestoreException):
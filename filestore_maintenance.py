@@ -49,13 +49,32 @@ class FileStoreMaintenance:
     async def rebuild_indexes(self):
         self.logger.info("Rebuilding indexes...")
         try:
-            # Clear existing indexes
-            self.filestore.index_manager.indexes.clear()
-            
-            # Rebuild indexes from document store
+            index_manager = self.filestore.index_manager
+
+            # Only the indexes rebuilt here are cleared; per-collection field
+            # indexes are kept up to date by the filestore's write path
+            for name in ('collection_id', 'label'):
+                index_manager.drop_index(name)
+            index_manager.create_indexes(['collection_id', 'label'])
+
+            # Collect every key in one pass over the document store, then load each
+            # index in bulk (documents without the field are left out of its index)
+            collection_keys, collection_ids = [], []
+            label_keys, label_ids = [], []
             for doc_id, document in self.filestore.document_store.data.items():
-                await self.filestore.index_manager.insert('collection_id', document.get('collection_id'), doc_id)
-                await self.filestore.index_manager.insert('label', document.get('label'), doc_id)
+                collection_id = document.get('collection_id')
+                if collection_id is not None:
+                    collection_keys.append(collection_id)
+                    collection_ids.append(doc_id)
+                label = document.get('label')
+                if label is not None:
+                    label_keys.append(label)
+                    label_ids.append(doc_id)
+
+            await asyncio.gather(
+                index_manager.bulk_insert('collection_id', collection_keys, collection_ids),
+                index_manager.bulk_insert('label', label_keys, label_ids)
+            )
             
             self.logger.info("Indexes rebuilt successfully")
         except Exception as e:
@@ -1,10 +1,36 @@
 import asyncio
+from array import array
+from bisect import bisect_left
+from functools import partial
 from typing import Dict, Any, List, Tuple, Optional, Callable
 from b_plus_tree import BPlusTree
 from index_manager_config import IndexManagerConfig
 import re
-from collections import defaultdict
+import time
+from collections import defaultdict, deque
+from itertools import chain
+from operator import itemgetter
 from filestore_exceptions import *
+from logger import Logger
+from lru_cache import LRUCache
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def _intersect_sorted(small, large) -> List[int]:
+    # Lists of similar size intersect fastest as C-level set operations; when
+    # one list is much larger, binary-searching it for each candidate (resuming
+    # from the previous hit) touches far fewer entries.
+    if len(large) <= 16 * len(small):
+        return sorted(set(small).intersection(large))
+    matches = []
+    lo = 0
+    for doc_id in small:
+        lo = bisect_left(large, doc_id, lo)
+        if lo == len(large):
+            break
+        if large[lo] == doc_id:
+            matches.append(doc_id)
+    return matches
 
 class Index:
     def __init__(self, tree: BPlusTree, is_compound: bool = False, filter_condition: Optional[Callable] = None):
@@ -19,12 +45,25 @@ class IndexManager:
         self.config = config
         self.indexes: Dict[str, Index] = {}
         self.ref_indexes: Dict[str, Index] = {}
-        self.text_indexes: Dict[str, Dict[str, List[int]]] = {}
-        self.async_update_queue = asyncio.Queue(maxsize=config.async_update_queue_size) if config.enable_async_updates else None
+        # Text index posting lists are sorted arrays of distinct doc ids
+        self.text_indexes: Dict[str, Dict[str, array]] = {}
+        # Text search results are cached under (index_name, query, version); any
+        # write to a text index bumps its version, so stale entries are never hit.
+        self._text_index_versions: Dict[str, int] = defaultdict(int)
+        self._text_query_cache = LRUCache(256)
+        self.logger = Logger.get_logger()
+        # Queued updates are (tree, operation, key, value) with operation 'insert' or 'delete'.
+        # A single consumer drains the deque; the event wakes it when updates arrive.
+        self.async_update_queue: Optional[deque] = deque() if config.enable_async_updates else None
+        self._async_update_ready = asyncio.Event()
         if config.enable_async_updates:
             asyncio.create_task(self._process_async_updates())
+        self._tree_order = max(2, (config.bplus_node_bytes // 8 + 1) // 2)
+
+    def _new_tree(self) -> BPlusTree:
+        return BPlusTree(order=self._tree_order)
 
-    async def create_index(self, name: str, is_compound: bool = False, filter_condition: Optional[Callable] = None):
+    def create_index(self, name: str, is_compound: bool = False, filter_condition: Optional[Callable] = None):
         try:
             if is_compound and not self.config.enable_compound_indexes:
                 raise ConfigurationException("Compound indexes are not enabled in the configuration")
@@ -34,11 +73,27 @@ class IndexManager:
             if name in self.indexes:
                 raise IndexAlreadyExistsError(f"Index {name} already exists")
             
-            self.indexes[name] = Index(BPlusTree(order=10), is_compound, filter_condition)
+            self.indexes[name] = Index(self._new_tree(), is_compound, filter_condition)
         except Exception as e:
             raise IndexException(f"Failed to create index {name}: {str(e)}")
 
-    async def create_ref_index(self, name: str):
+    def create_indexes(self, names: List[str]):
+        try:
+            duplicates = [name for name in names if name in self.indexes]
+            if duplicates:
+                raise IndexAlreadyExistsError(f"Indexes {', '.join(duplicates)} already exist")
+            if len(set(names)) != len(names):
+                raise IndexAlreadyExistsError(f"Duplicate index names in {names}")
+
+            for name in names:
+                self.indexes[name] = Index(self._new_tree())
+        except Exception as e:
+            raise IndexException(f"Failed to create indexes {names}: {str(e)}")
+
+    def drop_index(self, name: str):
+        self.indexes.pop(name, None)
+
+    def create_ref_index(self, name: str):
         try:
             if not self.config.enable_ref_indexing:
                 raise ConfigurationException("REF indexing is not enabled in the configuration")
@@ -46,11 +101,11 @@ class IndexManager:
             if name in self.ref_indexes:
                 raise IndexAlreadyExistsError(f"REF index {name} already exists")
             
-            self.ref_indexes[name] = Index(BPlusTree(order=10))
+            self.ref_indexes[name] = Index(self._new_tree())
         except Exception as e:
             raise IndexException(f"Failed to create REF index {name}: {str(e)}")
 
-    async def create_text_index(self, name: str):
+    def create_text_index(self, name: str):
         try:
             if not self.config.enable_text_search:
                 raise ConfigurationException("Text search is not enabled in the configuration")
@@ -58,7 +113,7 @@ class IndexManager:
             if name in self.text_indexes:
                 raise IndexAlreadyExistsError(f"Text index {name} already exists")
             
-            self.text_indexes[name] = {}
+            self.text_indexes[name] = defaultdict(partial(array, 'q'))
         except Exception as e:
             raise IndexException(f"Failed to create text index {name}: {str(e)}")
 
@@ -67,80 +122,137 @@ class IndexManager:
             if index_name in self.indexes:
                 index = self.indexes[index_name]
                 if not index.filter_condition or index.filter_condition(key):
-                    await self._insert_or_queue(index.tree.insert, key, value)
+                    await self._insert_or_queue(index.tree, key, value)
             elif index_name in self.ref_indexes:
-                await self._insert_or_queue(self.ref_indexes[index_name].tree.insert, key, value)
+                await self._insert_or_queue(self.ref_indexes[index_name].tree, key, value)
             elif index_name in self.text_indexes:
-                await self._insert_text_index(index_name, key, value)
+                self._insert_text_index(index_name, key, value)
             else:
                 raise IndexNotFoundError(f"Index {index_name} not found")
         except Exception as e:
             raise IndexException(f"Failed to insert into index {index_name}: {str(e)}")
 
-    async def _insert_or_queue(self, insert_func, key, value):
+    async def bulk_insert(self, index_name: str, keys: List[Any], values: List[int]):
+        try:
+            index = self.indexes.get(index_name) or self.ref_indexes.get(index_name)
+            if index is None:
+                raise IndexNotFoundError(f"Index {index_name} not found")
+
+            entries = zip(keys, values)
+            if index.filter_condition:
+                entries = ((key, value) for key, value in entries if index.filter_condition(key))
+            index.tree.bulk_load(sorted(entries, key=itemgetter(0)))
+        except Exception as e:
+            raise IndexException(f"Failed to bulk insert into index {index_name}: {str(e)}")
+
+    def insert_text_batch(self, index_name: str, docs: List[Tuple[int, str]]):
+        try:
+            if index_name not in self.text_indexes:
+                raise IndexNotFoundError(f"Text index {index_name} not found")
+            index = self.text_indexes[index_name]
+
+            # Gather each word's doc ids for the whole batch, then merge them into
+            # the posting lists with one extend (or one sort) per word.
+            batch = defaultdict(list)
+            for (doc_id, _), words in zip(docs, self._tokenize_batch([text for _, text in docs])):
+                for word in dict.fromkeys(words):
+                    batch[word].append(doc_id)
+
+            for word, doc_ids in batch.items():
+                postings = index[word]
+                doc_ids.sort()
+                if not postings or doc_ids[0] > postings[-1]:
+                    postings.extend(dict.fromkeys(doc_ids))
+                else:
+                    postings[:] = array('q', sorted(set(postings).union(doc_ids)))
+            self._text_index_versions[index_name] += 1
+        except Exception as e:
+            raise IndexException(f"Failed to batch insert into text index {index_name}: {str(e)}")
+
+    def _queue_update(self, update: Tuple[BPlusTree, str, Any, Any]):
+        if len(self.async_update_queue) >= self.config.async_update_queue_size:
+            raise ConcurrencyException("Async update queue is full")
+        self.async_update_queue.append(update)
+        self._async_update_ready.set()
+
+    async def _insert_or_queue(self, tree: BPlusTree, key, value):
         try:
             if self.config.enable_async_updates:
-                await self.async_update_queue.put((insert_func, key, value))
+                self._queue_update((tree, 'insert', key, value))
             else:
-                await insert_func(key, value)
-        except asyncio.QueueFull:
-            raise ConcurrencyException("Async update queue is full")
+                tree.insert(key, value)
+        except ConcurrencyException:
+            raise
         except Exception as e:
             raise IndexException(f"Failed to insert or queue update: {str(e)}")
 
-    async def _insert_text_index(self, index_name: str, text: str, doc_id: int):
+    def _insert_text_index(self, index_name: str, text: str, doc_id: int):
         try:
-            words = self._tokenize(text)
-            for word in words:
-                if word not in self.text_indexes[index_name]:
-                    self.text_indexes[index_name][word] = []
-                self.text_indexes[index_name][word].append(doc_id)
+            index = self.text_indexes[index_name]
+            self._text_index_versions[index_name] += 1
+            for word in self._tokenize(text):
+                postings = index[word]
+                # Doc ids mostly arrive in increasing order, making this an append
+                if not postings or doc_id > postings[-1]:
+                    postings.append(doc_id)
+                elif doc_id != postings[-1]:
+                    i = bisect_left(postings, doc_id)
+                    if postings[i] != doc_id:
+                        postings.insert(i, doc_id)
         except Exception as e:
             raise IndexException(f"Failed to insert into text index {index_name}: {str(e)}")
 
     def _tokenize(self, text: str) -> List[str]:
         # Simple tokenization, can be improved with proper NLP libraries
-        return re.findall(r'\w+', text.lower())
+        return _TOKEN_RE.findall(text.lower())
+
+    def _tokenize_batch(self, texts: List[str]) -> List[List[str]]:
+        findall = _TOKEN_RE.findall
+        return [findall(text.lower()) for text in texts]
 
     async def search(self, index_name: str, key: Any) -> Optional[Any]:
         try:
-            if self.config.enable_usage_statistics:
-                return await self._search_with_stats(index_name, key)
-            
-            if index_name in self.indexes:
-                return await self.indexes[index_name].tree.search(key)
-            elif index_name in self.ref_indexes:
-                return await self.ref_indexes[index_name].tree.search(key)
-            else:
+            index = self.indexes.get(index_name) or self.ref_indexes.get(index_name)
+            if index is None:
                 raise IndexNotFoundError(f"Index {index_name} not found")
+
+            if self.config.enable_usage_statistics:
+                return self._search_with_stats(index, key)
+            return index.tree.search(key)
         except Exception as e:
             raise QueryException(f"Failed to search in index {index_name}: {str(e)}")
 
-    async def _search_with_stats(self, index_name: str, key: Any) -> Optional[Any]:
-        start_time = asyncio.get_event_loop().time()
-        try:
-            result = await self.search(index_name, key)
-            query_time = asyncio.get_event_loop().time() - start_time
-            
-            if index_name in self.indexes:
-                self.indexes[index_name].access_count += 1
-                self.indexes[index_name].total_query_time += query_time
-            elif index_name in self.ref_indexes:
-                self.ref_indexes[index_name].access_count += 1
-                self.ref_indexes[index_name].total_query_time += query_time
-            
-            return result
-        except Exception as e:
-            raise QueryException(f"Failed to search with stats in index {index_name}: {str(e)}")
+    def _search_with_stats(self, index: Index, key: Any) -> Optional[Any]:
+        start_time = time.perf_counter()
+        result = index.tree.search(key)
+        index.access_count += 1
+        index.total_query_time += time.perf_counter() - start_time
+        return result
 
     async def text_search(self, index_name: str, query: str) -> List[int]:
         try:
             if not self.config.enable_text_search:
                 raise ConfigurationException("Text search is not enabled in the configuration")
             
-            words = self._tokenize(query)
-            results = [set(self.text_indexes[index_name].get(word, [])) for word in words]
-            return list(set.intersection(*results) if results else set())
+            index = self.text_indexes[index_name]
+            cache_key = (index_name, query, self._text_index_versions[index_name])
+            cached = self._text_query_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+
+            words = set(self._tokenize(query))
+            if not words:
+                return []
+
+            # Intersect smallest posting list first
+            postings = sorted((index.get(word, ()) for word in words), key=len)
+            result = postings[0]
+            for other in postings[1:]:
+                if not result:
+                    break
+                result = _intersect_sorted(result, other)
+            self._text_query_cache.put(cache_key, tuple(result))
+            return list(result)
         except KeyError:
             raise IndexNotFoundError(f"Text index {index_name} not found")
         except Exception as e:
@@ -149,20 +261,20 @@ class IndexManager:
     async def range_query(self, index_name: str, start_key: Any, end_key: Any) -> List[Any]:
         try:
             if index_name in self.indexes:
-                return await self.indexes[index_name].tree.range_query(start_key, end_key)
+                return self.indexes[index_name].tree.range_query(start_key, end_key)
             elif index_name in self.ref_indexes:
-                return await self.ref_indexes[index_name].tree.range_query(start_key, end_key)
+                return self.ref_indexes[index_name].tree.range_query(start_key, end_key)
             else:
                 raise IndexNotFoundError(f"Index {index_name} not found")
         except Exception as e:
             raise QueryException(f"Failed to perform range query in index {index_name}: {str(e)}")
 
-    async def delete(self, index_name: str, key: Any):
+    async def delete(self, index_name: str, key: Any, value: Optional[int] = None):
         try:
             if index_name in self.indexes:
-                await self._delete_or_queue(self.indexes[index_name].tree.delete, key)
+                await self._delete_or_queue(self.indexes[index_name].tree, key, value)
             elif index_name in self.ref_indexes:
-                await self._delete_or_queue(self.ref_indexes[index_name].tree.delete, key)
+                await self._delete_or_queue(self.ref_indexes[index_name].tree, key, value)
             elif index_name in self.text_indexes:
                 # Implement text index deletion logic
                 pass
@@ -171,25 +283,48 @@ class IndexManager:
         except Exception as e:
             raise IndexException(f"Failed to delete from index {index_name}: {str(e)}")
 
-    async def _delete_or_queue(self, delete_func, key):
+    async def _delete_or_queue(self, tree: BPlusTree, key, value=None):
         try:
             if self.config.enable_async_updates:
-                await self.async_update_queue.put((delete_func, key))
+                self._queue_update((tree, 'delete', key, value))
             else:
-                await delete_func(key)
-        except asyncio.QueueFull:
-            raise ConcurrencyException("Async update queue is full")
+                tree.delete(key, value)
+        except ConcurrencyException:
+            raise
         except Exception as e:
             raise IndexException(f"Failed to delete or queue deletion: {str(e)}")
 
     async def _process_async_updates(self):
+        queue = self.async_update_queue
         while True:
+            if not queue:
+                self._async_update_ready.clear()
+                await self._async_update_ready.wait()
+            popleft = queue.popleft
+            batch = [popleft() for _ in range(min(len(queue), self.config.async_batch_size))]
+            self._apply_updates(batch)
+            # Let producers run between batches
+            await asyncio.sleep(0)
+
+    def _apply_updates(self, batch: List[Tuple[BPlusTree, str, Any, Any]]):
+        # Consecutive updates of the same kind against the same tree are applied
+        # together; runs are processed in queue order so inserts and deletes of a
+        # key never overtake each other.
+        start = 0
+        while start < len(batch):
+            tree, operation = batch[start][0], batch[start][1]
+            stop = start + 1
+            while stop < len(batch) and batch[stop][0] is tree and batch[stop][1] == operation:
+                stop += 1
             try:
-                func, *args = await self.async_update_queue.get()
-                await func(*args)
-                self.async_update_queue.task_done()
+                if operation == 'insert':
+                    tree.insert_many([(key, value) for _, _, key, value in batch[start:stop]])
+                else:
+                    for _, _, key, value in batch[start:stop]:
+                        tree.delete(key, value)
             except Exception as e:
                 self.logger.error(f"Error processing async update: {str(e)}")
+            start = stop
 
     def get_usage_statistics(self) -> Dict[str, Dict[str, Any]]:
         try:
@@ -197,10 +332,11 @@ class IndexManager:
                 raise ConfigurationException("Usage statistics are not enabled in the configuration")
             
             stats = {}
-            for name, index in {**self.indexes, **self.ref_indexes}.items():
+            for name, index in chain(self.indexes.items(), self.ref_indexes.items()):
+                access_count = index.access_count
                 stats[name] = {
-                    "access_count": index.access_count,
-                    "avg_query_time": index.total_query_time / index.access_count if index.access_count > 0 else 0
+                    "access_count": access_count,
+                    "avg_query_time": index.total_query_time / access_count if access_count > 0 else 0
                 }
             return stats
         except Exception as e:
@@ -9,4 +9,7 @@ class IndexManagerConfig:
         self.enable_async_updates = config.get('enable_async_updates', False)
         self.enable_usage_statistics = config.get('enable_usage_statistics', False)
         self.async_update_queue_size = config.get('async_update_queue_size', 1000)
+        self.async_batch_size = config.get('async_batch_size', 256)
+        # Bytes of 64-bit key slots per B+ tree node; a node holds up to 2 * order - 1 keys
+        self.bplus_node_bytes = config.get('bplus_node_bytes', 512)
         self.text_search_language = config.get('text_search_language', 'english')
@@ -1,27 +1,110 @@
 import asyncio
 import json
-from typing import Dict, Any, List
+import os
+import serialization
+from typing import Dict, Any, List, Optional
+
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = -1
+if _IOV_MAX <= 0:
+    _IOV_MAX = 1024
 
 class Journal:
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, flush_threshold: int = 64, flush_interval: float = 0.01,
+                 max_batch: int = 256):
         self.filename = filename
         self.lock = asyncio.Lock()
+        self.flush_threshold = flush_threshold
+        self.flush_interval = flush_interval
+        # Entries handed to a single writev; the kernel rejects more than IOV_MAX
+        self.max_batch = min(max_batch, _IOV_MAX)
+        self._fd: Optional[int] = None
+        self._buf: List[bytes] = []
+        self._committed: Optional[asyncio.Future] = None
+        self._writing: Optional[asyncio.Future] = None
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _ensure_flusher(self):
+        # Started lazily so the journal can be constructed outside a running loop.
+        if self._flusher is None:
+            self._flush_event = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_entries())
 
     async def log_operation(self, operation: str, data: Dict[str, Any]):
-        async with self.lock:
+        # Appending is a plain list append; the background flusher writes the
+        # buffer out once it holds flush_threshold entries or flush_interval has
+        # passed since the first one, whichever comes first. Every caller in a
+        # batch waits on the same future, shielded so that cancelling one caller
+        # does not cancel the rest of the batch.
+        self._ensure_flusher()
+        if self._committed is None:
+            self._committed = asyncio.get_running_loop().create_future()
+        committed = self._committed
+        buf = self._buf
+        buf.append(serialization.dumps({"operation": operation, "data": data}) + b"\n")
+        if len(buf) == 1 or len(buf) >= self.flush_threshold:
+            self._flush_event.set()
+        await asyncio.shield(committed)
+
+    async def _flush_entries(self):
+        event = self._flush_event
+        while True:
+            await event.wait()
+            event.clear()
+            if len(self._buf) < self.flush_threshold:
+                try:
+                    await asyncio.wait_for(event.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+            entries, self._buf = self._buf, []
+            committed, self._committed = self._committed, None
+            if not entries:
+                continue
+            self._writing = committed
             try:
-                entry = json.dumps({"operation": operation, "data": data})
-                with open(self.filename, "a") as f:
-                    f.write(entry + "\n")
-            except IOError as e:
-                print(f"Error logging operation: {e}")
+                await asyncio.to_thread(self._write_entries, entries)
+            except Exception as e:
+                # A batch that did not reach the disk fails its callers rather than
+                # reporting them durable; the flusher stays up for later batches
+                committed.set_exception(e)
+            finally:
+                self._writing = None
+                if not committed.done():
+                    committed.set_result(None)
+
+    async def flush(self):
+        if self._writing is not None:
+            await asyncio.shield(self._writing)
+        if self._committed is not None:
+            committed = self._committed
+            self._flush_event.set()
+            await asyncio.shield(committed)
+
+    def _write_entries(self, entries: List[bytes]):
+        if self._fd is None:
+            self._fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # The buffer is written max_batch entries per writev, then committed
+        # with a single fsync
+        for start in range(0, len(entries), self.max_batch):
+            chunk = entries[start:start + self.max_batch]
+            written = os.writev(self._fd, chunk)
+            total = sum(len(entry) for entry in chunk)
+            if written < total:
+                remaining = b"".join(chunk)[written:]
+                while remaining:
+                    remaining = remaining[os.write(self._fd, remaining):]
+        os.fsync(self._fd)
 
     async def recover(self) -> List[Dict[str, Any]]:
         operations = []
         try:
-            with open(self.filename, "r") as f:
+            with open(self.filename, "rb") as f:
                 for line in f:
-                    operations.append(json.loads(line))
+                    operations.append(serialization.loads(line))
         except (IOError, json.JSONDecodeError) as e:
             print(f"Error recovering from journal: {e}")
         return operations
@@ -29,6 +112,31 @@ class Journal:
     async def clear(self):
         async with self.lock:
             try:
-                open(self.filename, "w").close()
+                await self.flush()
+                if self._fd is not None:
+                    os.ftruncate(self._fd, 0)
+                else:
+                    open(self.filename, "w").close()
             except IOError as e:
                 print(f"Error clearing journal: {e}")
+
+    async def close(self):
+        # Writes out anything still buffered, then stops the flusher and closes
+        # the file; the flusher starts again lazily, on the running loop, if the
+        # journal is used again.
+        async with self.lock:
+            try:
+                while self._writing is not None or self._committed is not None:
+                    await self.flush()
+            finally:
+                if self._flusher is not None:
+                    self._flusher.cancel()
+                    try:
+                        await self._flusher
+                    except asyncio.CancelledError:
+                        pass
+                    self._flusher = None
+                    self._flush_event = None
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
@@ -1,23 +1,26 @@
 import json
 import os
-import zlib
 import asyncio
 import time
 from typing import Dict, Any, Optional, List
-from index_manager import IndexManager
+from index_manager import IndexManager, IndexManagerConfig
 from reader_writer_lock import ReaderWriterLock, reader_lock, writer_lock
 from lru_cache import LRUCache
+from lock_pool import LockPool
 from logger import Logger
+import serialization
 from filestore_exceptions import *
 
 class JSONFilestore:
     def __init__(self, filename: str, cache_capacity: int = 100):
         self.filename = filename
         self.data: Dict[int, Dict[str, Any]] = {}
-        self.index_manager = IndexManager()
+        # collection_id -> doc ids in that collection (a dict used as an ordered set)
+        self._by_collection: Dict[Any, Dict[int, None]] = {}
+        self.index_manager = IndexManager(IndexManagerConfig({}))
         self.compression_queue = asyncio.Queue()
         self.lock = ReaderWriterLock()
-        self.locks = {}
+        self.locks = LockPool()
         self.cache = LRUCache(cache_capacity)
         self.next_id = 1
         self.logger = Logger.get_logger()
@@ -27,9 +30,12 @@ class JSONFilestore:
     def load_data(self):
         try:
             if os.path.exists(self.filename):
-                with open(self.filename, 'r') as f:
-                    self.data = json.load(f)
+                with open(self.filename, 'rb') as f:
+                    self.data = serialization.loads(f.read())
                 self.next_id = max(self.data.keys()) + 1 if self.data else 1
+                self._by_collection = {}
+                for doc_id, document in self.data.items():
+                    self._add_to_collection(doc_id, document.get('collection_id'))
                 self.logger.info(f"Data loaded from {self.filename}")
             else:
                 self.logger.warning(f"File {self.filename} does not exist. Starting with empty data.")
@@ -54,14 +60,17 @@ class JSONFilestore:
 
     async def _create_with_id(self, doc_id: int, document: Dict[str, Any]) -> int:
         try:
+            now = int(time.time())
             document['id'] = doc_id
-            document['created_at'] = int(time.time())
-            document['updated_at'] = int(time.time())
+            document['created_at'] = now
+            document['updated_at'] = now
             self.data[doc_id] = document
+            self._add_to_collection(doc_id, document.get('collection_id'))
             self.cache.put(doc_id, document)
-            if len(json.dumps(document)) > 4 * 1024:  # 4 KB
-                await self.compression_queue.put((doc_id, document))
-            self.logger.info(f"Document created with id {doc_id}")
+            payload = self._compressible_payload(document)
+            if payload is not None:
+                await self.compression_queue.put((doc_id, document, document['data'], payload))
+            self.logger.info("Document created with id %s", doc_id)
             return doc_id
         except Exception as e:
             raise StorageException(f"Error creating document with id {doc_id}: {str(e)}")
@@ -95,14 +104,21 @@ class JSONFilestore:
                 raise DocumentNotFoundError(f"Document with id {doc_id} not found")
 
             document = self.data[doc_id]
+            old_collection_id = document.get('collection_id')
             document.update(updates)
+            if 'data' in updates:
+                document['compressed'] = False
             document['updated_at'] = int(time.time())
+            if document.get('collection_id') != old_collection_id:
+                self._remove_from_collection(doc_id, old_collection_id)
+                self._add_to_collection(doc_id, document.get('collection_id'))
             self.cache.put(doc_id, document)
 
-            if len(json.dumps(document)) > 4 * 1024:  # 4 KB
-                await self.compression_queue.put((doc_id, document))
+            payload = self._compressible_payload(document)
+            if payload is not None:
+                await self.compression_queue.put((doc_id, document, document['data'], payload))
 
-            self.logger.info(f"Document {doc_id} updated")
+            self.logger.info("Document %s updated", doc_id)
             return True
         except DocumentNotFoundError:
             raise
@@ -115,36 +131,49 @@ class JSONFilestore:
             if doc_id not in self.data:
                 raise DocumentNotFoundError(f"Document with id {doc_id} not found")
 
-            del self.data[doc_id]
+            document = self.data.pop(doc_id)
+            self._remove_from_collection(doc_id, document.get('collection_id'))
             self.cache.invalidate(doc_id)
-            self.logger.info(f"Document {doc_id} deleted")
+            self.logger.info("Document %s deleted", doc_id)
             return True
         except DocumentNotFoundError:
             raise
         except Exception as e:
             raise StorageException(f"Error deleting document {doc_id}: {str(e)}")
 
-    async def _compress_data(self, data: str) -> bytes:
+    @staticmethod
+    def _compressible_payload(document: Dict[str, Any]) -> Optional[bytes]:
+        # The encoded payload is measured against the size gate and then handed to
+        # the compression worker as-is, so it is only serialized once.
+        if 'data' not in document or document.get('compressed'):
+            return None
+        payload = serialization.dumps(document['data'])
+        return payload if len(payload) > 4 * 1024 else None  # 4 KB
+
+    async def _compress_data(self, data: bytes) -> bytes:
         try:
-            return zlib.compress(data.encode('utf-8'))
+            return serialization.compress(data)
         except Exception as e:
             raise StorageException(f"Error compressing data: {str(e)}")
 
     async def _decompress_data(self, data: bytes) -> str:
         try:
-            return zlib.decompress(data).decode('utf-8')
+            return serialization.decompress(data).decode('utf-8')
         except Exception as e:
             raise StorageException(f"Error decompressing data: {str(e)}")
 
     async def process_compression_queue(self):
         while True:
-            doc_id, document = await self.compression_queue.get()
+            doc_id, document, data, payload = await self.compression_queue.get()
             try:
-                compressed_data = await self._compress_data(json.dumps(document['data']))
+                # The document was deleted or rewritten since it was queued
+                if self.data.get(doc_id) is not document or document.get('data') is not data:
+                    continue
+                compressed_data = await self._compress_data(payload)
                 document['data'] = compressed_data
                 document['compressed'] = True
                 self.data[doc_id] = document
-                self.logger.info(f"Compressed document {doc_id}")
+                self.logger.info("Compressed document %s", doc_id)
             except Exception as e:
                 self.logger.error(f"Error compressing document {doc_id}: {str(e)}")
             finally:
@@ -153,6 +182,17 @@ class JSONFilestore:
     @reader_lock
     async def query_by_collection_id(self, collection_id: int) -> List[Dict[str, Any]]:
         try:
-            return [doc for doc in self.data.values() if doc.get('collection_id') == collection_id]
+            return [self.data[doc_id] for doc_id in self._by_collection.get(collection_id, ())]
         except Exception as e:
             raise QueryException(f"Error querying documents by collection_id {collection_id}: {str(e)}")
+
+    def _add_to_collection(self, doc_id: int, collection_id: Any):
+        if collection_id is not None:
+            self._by_collection.setdefault(collection_id, {})[doc_id] = None
+
+    def _remove_from_collection(self, doc_id: int, collection_id: Any):
+        members = self._by_collection.get(collection_id)
+        if members is not None:
+            members.pop(doc_id, None)
+            if not members:
+                del self._by_collection[collection_id]
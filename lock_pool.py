@@ -0,0 +1,18 @@
+import asyncio
+from typing import Hashable
+from weakref import WeakValueDictionary
+
+class LockPool:
+    def __init__(self):
+        # Only locks somebody still references (a holder or a waiter) stay in
+        # the pool; idle ones are dropped by the garbage collector.
+        self._locks: WeakValueDictionary = WeakValueDictionary()
+
+    def get(self, key: Hashable) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def __len__(self) -> int:
+        return len(self._locks)
@@ -1,55 +1,56 @@
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 
+_logger = logging.getLogger('EnhancedFilestore')
+_listener: Optional[QueueListener] = None
+
+def _configure():
+    global _listener
+    if _logger.handlers:
+        return
+    _logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Console handler
+    ch = logging.StreamHandler(sys.stdout)
+    ch.setLevel(logging.INFO)
+    ch.setFormatter(formatter)
+
+    # File handler (the file is only created once something is logged)
+    fh = logging.FileHandler('filestore.log', delay=True)
+    fh.setLevel(logging.DEBUG)
+    fh.setFormatter(formatter)
+
+    # Callers only enqueue records; console and file I/O happen on the
+    # listener's thread so logging never blocks the event loop.
+    records = queue.SimpleQueue()
+    _logger.addHandler(QueueHandler(records))
+    _listener = QueueListener(records, ch, fh, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+_configure()
+
 class Logger:
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Logger, cls).__new__(cls)
-            cls._instance._logger = logging.getLogger('EnhancedFilestore')
-            cls._instance._logger.setLevel(logging.DEBUG)
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            
-            # Console handler
-            ch = logging.StreamHandler(sys.stdout)
-            ch.setLevel(logging.INFO)
-            ch.setFormatter(formatter)
-            cls._instance._logger.addHandler(ch)
-            
-            # File handler
-            fh = logging.FileHandler('filestore.log')
-            fh.setLevel(logging.DEBUG)
-            fh.setFormatter(formatter)
-            cls._instance._logger.addHandler(fh)
-        
+            cls._instance._logger = _logger
         return cls._instance
 
     @classmethod
     def get_logger(cls):
-        return cls()._logger
-
-    @staticmethod
-    def debug(msg: str, *args, **kwargs):
-        Logger.get_logger().debug(msg, *args, **kwargs)
-
-    @staticmethod
-    def info(msg: str, *args, **kwargs):
-        Logger.get_logger().info(msg, *args, **kwargs)
-
-    @staticmethod
-    def warning(msg: str, *args, **kwargs):
-        Logger.get_logger().warning(msg, *args, **kwargs)
-
-    @staticmethod
-    def error(msg: str, *args, **kwargs):
-        Logger.get_logger().error(msg, *args, **kwargs)
-
-    @staticmethod
-    def critical(msg: str, *args, **kwargs):
-        Logger.get_logger().critical(msg, *args, **kwargs)
-
-    @staticmethod
-    def exception(msg: str, *args, exc_info: bool = True, **kwargs):
-        Logger.get_logger().exception(msg, *args, exc_info=exc_info, **kwargs)
+        return _logger
+
+    debug = staticmethod(_logger.debug)
+    info = staticmethod(_logger.info)
+    warning = staticmethod(_logger.warning)
+    error = staticmethod(_logger.error)
+    critical = staticmethod(_logger.critical)
+    exception = staticmethod(_logger.exception)
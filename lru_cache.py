@@ -1,24 +1,29 @@
 from collections import OrderedDict
 from typing import Any, Optional
 
+_MISSING = object()
+
 class LRUCache:
     def __init__(self, capacity: int):
         self.capacity = capacity
         self.cache = OrderedDict()
 
     def get(self, key: Any) -> Optional[Any]:
-        if key not in self.cache:
+        # Popping and re-inserting refreshes recency with two C-level dict
+        # operations instead of a membership test, move_to_end and a lookup.
+        cache = self.cache
+        value = cache.pop(key, _MISSING)
+        if value is _MISSING:
             return None
-        self.cache.move_to_end(key)
-        return self.cache[key]
+        cache[key] = value
+        return value
 
     def put(self, key: Any, value: Any) -> None:
-        if key in self.cache:
-            self.cache.move_to_end(key)
-        self.cache[key] = value
-        if len(self.cache) > self.capacity:
-            self.cache.popitem(last=False)
+        cache = self.cache
+        cache.pop(key, None)
+        cache[key] = value
+        if len(cache) > self.capacity:
+            cache.popitem(last=False)
 
     def invalidate(self, key: Any) -> None:
-        if key in self.cache:
-            del self.cache[key]
+        self.cache.pop(key, None)
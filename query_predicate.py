@@ -0,0 +1,29 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict
+
+class Predicate(ABC):
+    @abstractmethod
+    def matches(self, document: Dict[str, Any]) -> bool:
+        pass
+
+class FieldEq(Predicate):
+    def __init__(self, field: str, value: Any):
+        self.field = field
+        self.value = value
+
+    def matches(self, document: Dict[str, Any]) -> bool:
+        return document.get(self.field) == self.value
+
+class And(Predicate):
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def matches(self, document: Dict[str, Any]) -> bool:
+        return all(predicate.matches(document) for predicate in self.predicates)
+
+class Or(Predicate):
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def matches(self, document: Dict[str, Any]) -> bool:
+        return any(predicate.matches(document) for predicate in self.predicates)
@@ -1,50 +1,68 @@
 import asyncio
+from contextlib import nullcontext
+from functools import wraps
 
 class ReaderWriterLock:
+    """Writer-preferring readers-writer lock.
+
+    Any number of readers may hold the lock together; a writer holds it alone.
+    Once a writer is waiting, new readers queue behind it so writers are not starved.
+    """
+
     def __init__(self):
-        self._read_ready = asyncio.Event()
-        self._read_ready.set()
+        self._cond = asyncio.Condition()
         self._readers = 0
-        self._writers = 0
-        self._write_lock = asyncio.Lock()
+        self._writer = False
+        self._waiting_writers = 0
 
     async def acquire_read(self):
-        await self._read_ready.wait()
-        async with self._write_lock:
+        async with self._cond:
+            while self._writer or self._waiting_writers:
+                await self._cond.wait()
             self._readers += 1
-            if self._readers == 1:
-                self._read_ready.clear()
 
     async def release_read(self):
-        async with self._write_lock:
+        async with self._cond:
             self._readers -= 1
             if self._readers == 0:
-                self._read_ready.set()
+                self._cond.notify_all()
 
     async def acquire_write(self):
-        async with self._write_lock:
-            self._writers += 1
-            if self._writers == 1:
-                await self._read_ready.wait()
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._readers or self._writer:
+                    await self._cond.wait()
+            except BaseException:
+                # A cancelled writer must not keep readers parked behind it
+                self._waiting_writers -= 1
+                self._cond.notify_all()
+                raise
+            self._waiting_writers -= 1
+            self._writer = True
 
     async def release_write(self):
-        self._writers -= 1
-        if self._writers == 0:
-            self._read_ready.set()
-
-class AsyncLock:
-    def __init__(self, lock):
-        self.lock = lock
-
-    async def __aenter__(self):
-        await self.lock.acquire()
+        async with self._cond:
+            self._writer = False
+            self._cond.notify_all()
 
-    async def __aexit__(self, exc_type, exc, tb):
-        self.lock.release()
+def _key_lock(self, namespace: str, args):
+    # Per-key lock from the instance's LockPool, keyed by the method's first
+    # parameter name and argument so doc ids and collection ids never collide.
+    # Calls whose first argument cannot be a key (a document dict) skip it.
+    key = args[0] if args else None
+    try:
+        # isinstance(key, Hashable) passes tuples that hold unhashable items
+        hash(key)
+    except TypeError:
+        return nullcontext()
+    return self.locks.get((namespace, key))
 
 def reader_lock(func):
+    namespace = func.__code__.co_varnames[1] if func.__code__.co_argcount > 1 else ''
+    @wraps(func)
     async def wrapper(self, *args, **kwargs):
-        async with AsyncLock(await self.locks.get(args[0], create=True)):
+        async with _key_lock(self, namespace, args):
             await self.lock.acquire_read()
             try:
                 return await func(self, *args, **kwargs)
@@ -53,8 +71,10 @@ def reader_lock(func):
     return wrapper
 
 def writer_lock(func):
+    namespace = func.__code__.co_varnames[1] if func.__code__.co_argcount > 1 else ''
+    @wraps(func)
     async def wrapper(self, *args, **kwargs):
-        async with AsyncLock(await self.locks.get(args[0], create=True)):
+        async with _key_lock(self, namespace, args):
             await self.lock.acquire_write()
             try:
                 return await func(self, *args, **kwargs)
@@ -1,28 +1,55 @@
 from typing import Dict, Any, Optional, List, Tuple, Type
 
+_TYPE_CHECKS = {
+    'string': lambda value: isinstance(value, str),
+    'integer': lambda value: isinstance(value, int),
+    'float': lambda value: isinstance(value, (int, float)),
+    'boolean': lambda value: isinstance(value, bool),
+    'list': lambda value: isinstance(value, list),
+    'dict': lambda value: isinstance(value, dict),
+}
+
+def _accept_any(value: Any) -> bool:
+    return True  # Unknown types are considered valid
+
 class FieldDefinition:
     def __init__(self, field_type: str, required: bool = False, default: Any = None, ref: Optional[str] = None):
         self.field_type: str = field_type
         self.required: bool = required
         self.default: Any = default
         self.ref: Optional[str] = ref
+        self.is_ref: bool = field_type == 'REF'
+        self.check = _TYPE_CHECKS.get(field_type, _accept_any)
 
 class Schema:
     def __init__(self, fields: Dict[str, FieldDefinition], foreign_keys: Optional[Dict[str, Tuple[str, str]]] = None):
         self.fields: Dict[str, FieldDefinition] = fields
         self.foreign_keys: Dict[str, Tuple[str, str]] = foreign_keys or {}
+        # Only REF fields and foreign keys need to look at other documents
+        self.needs_filestore: bool = bool(self.foreign_keys) or any(field_def.is_ref for field_def in fields.values())
 
-    async def validate(self, document: Dict[str, Any], filestore: Any) -> bool:
+    def validate_local(self, document: Dict[str, Any]) -> bool:
         for field_name, field_def in self.fields.items():
             if field_name not in document:
                 if field_def.required:
                     return False
                 if field_def.default is not None:
                     document[field_name] = field_def.default
-            else:
-                if not await self._validate_field_type(document[field_name], field_def, filestore):
+            elif not field_def.is_ref and not field_def.check(document[field_name]):
+                return False
+        return True
+
+    async def validate(self, document: Dict[str, Any], filestore: Any) -> bool:
+        if not self.validate_local(document):
+            return False
+        if not self.needs_filestore:
+            return True
+
+        for field_name, field_def in self.fields.items():
+            if field_def.is_ref and field_name in document:
+                if not await self._validate_ref(document[field_name], field_def.ref, filestore):
                     return False
-        
+
         # Validate foreign key constraints
         for field_name, (ref_collection, ref_field) in self.foreign_keys.items():
             if field_name in document:
@@ -31,24 +58,6 @@ class Schema:
         
         return True
 
-    async def _validate_field_type(self, value: Any, field_def: FieldDefinition, filestore: Any) -> bool:
-        if field_def.field_type == 'REF':
-            return await self._validate_ref(value, field_def.ref, filestore)
-        elif field_def.field_type == 'string':
-            return isinstance(value, str)
-        elif field_def.field_type == 'integer':
-            return isinstance(value, int)
-        elif field_def.field_type == 'float':
-            return isinstance(value, (int, float))
-        elif field_def.field_type == 'boolean':
-            return isinstance(value, bool)
-        elif field_def.field_type == 'list':
-            return isinstance(value, list)
-        elif field_def.field_type == 'dict':
-            return isinstance(value, dict)
-        else:
-            return True  # Unknown types are considered valid
-
     async def _validate_ref(self, value: Dict[str, Any], ref_collection: str, filestore: Any) -> bool:
         if not isinstance(value, dict) or 'collection' not in value or 'id' not in value:
             return False
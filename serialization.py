@@ -0,0 +1,50 @@
+import json
+import zlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; fall back to fast zlib
+    zstandard = None
+
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_zstd_compressor = zstandard.ZstdCompressor(level=3) if zstandard is not None else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+def dumps(obj: Any) -> bytes:
+    """Serialize obj to compact UTF-8 encoded JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def loads(data: Any) -> Any:
+    """Deserialize JSON from str or any bytes-like object.
+
+    Both backends raise a subclass of json.JSONDecodeError on invalid input.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def compress(data: bytes) -> bytes:
+    """Compress data with zstd when available, otherwise with zlib at its fastest level."""
+    if _zstd_compressor is not None:
+        return _zstd_compressor.compress(data)
+    return zlib.compress(data, 1)
+
+def decompress(data: bytes) -> bytes:
+    """Decompress output of compress().
+
+    zstd frames and zlib streams have distinct headers, so blobs written by
+    either backend (including older zlib-only ones) are detected by their magic.
+    """
+    if data[:4] == _ZSTD_MAGIC:
+        if _zstd_decompressor is None:
+            raise ValueError("zstd-compressed data requires the zstandard package")
+        return _zstd_decompressor.decompress(data)
+    return zlib.decompress(data)
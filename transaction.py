@@ -1,107 +1,361 @@
 import asyncio
-from typing import List, Dict, Any, Callable
+import itertools
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Set, Tuple
 import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from logger import Logger
 from filestore_exceptions import *
 
+_LOG = Logger.get_logger()
+
 class Transaction:
-    def __init__(self, transaction_id: int):
+    __slots__ = ('id', '_steps', 'n_steps', 'declared_locks', 'independent_steps', 'locks',
+                 'started', 'start_time', 'slot', 'wounded')
+
+    def __init__(self, transaction_id: int, n_ops: int = 0):
         self.id = transaction_id
-        self.operations: List[Callable] = []
-        self.rollback_operations: List[Callable] = []
+        # One (operation, rollback, lock) tuple per step; lock may be None. With
+        # an n_ops hint the list is allocated once and filled in place.
+        self._steps: List[Tuple[Callable, Callable, Optional[asyncio.Lock]]] = [None] * n_ops
+        self.n_steps = 0
+        self.declared_locks: List[asyncio.Lock] = []
+        # Indexes of steps whose lock may be released as soon as they finish
+        self.independent_steps: Set[int] = set()
         self.locks: List[asyncio.Lock] = []
-        self.start_time = time.time()
-        self.logger = Logger.get_logger()
+        self.started: List[int] = []
+        self.start_time: Optional[float] = None
+        self.slot = -1
+        # Set by an older transaction that needs a lock this one holds
+        self.wounded = False
 
-    async def add_operation(self, operation: Callable, rollback: Callable, lock: asyncio.Lock):
-        try:
-            self.operations.append(operation)
-            self.rollback_operations.append(rollback)
+    @property
+    def steps(self) -> List[Tuple[Callable, Callable, Optional[asyncio.Lock]]]:
+        # Every reader goes through here, so slots left unused by an n_ops hint
+        # that was too generous are dropped before anything iterates the steps
+        if self.n_steps < len(self._steps):
+            del self._steps[self.n_steps:]
+        return self._steps
+
+    def declare_locks(self, locks: Iterable[asyncio.Lock]):
+        self.declared_locks.extend(locks)
+
+    def add_operation(self, operation: Callable, rollback: Callable, lock: Optional[asyncio.Lock] = None):
+        if self.n_steps < len(self._steps):
+            self._steps[self.n_steps] = (operation, rollback, lock)
+        else:
+            self._steps.append((operation, rollback, lock))
+        self.n_steps += 1
+        _LOG.info("Transaction %s: Added operation", self.id)
+
+    def add_independent_operation(self, operation: Callable, rollback: Callable, lock: asyncio.Lock):
+        # The step's lock is released right after it runs instead of at commit;
+        # if the transaction later aborts, its rollback runs as a compensation
+        # without the lock.
+        self.independent_steps.add(self.n_steps)
+        self.add_operation(operation, rollback, lock)
+
+    def _early_releases(self) -> Dict[int, asyncio.Lock]:
+        # A lock can go early only if every step using it is independent and it
+        # was not declared separately; it is released after its last such step.
+        # All locks are taken before the first step runs, so no acquire ever
+        # follows a release (the two-phase locking shrinking phase).
+        held = {id(lock) for lock in self.declared_locks}
+        last_use: Dict[int, Tuple[int, asyncio.Lock]] = {}
+        for index, (_, _, lock) in enumerate(self.steps):
+            if lock is None:
+                continue
+            if index not in self.independent_steps:
+                held.add(id(lock))
+            last_use[id(lock)] = (index, lock)
+        return {index: lock for key, (index, lock) in last_use.items() if key not in held}
+
+    def lock_order(self) -> List[asyncio.Lock]:
+        # Every transaction takes its locks in the same global order, so no two
+        # transactions can each hold a lock the other is waiting for.
+        locks = {id(lock): lock for _, _, lock in self.steps if lock is not None}
+        locks.update((id(lock), lock) for lock in self.declared_locks)
+        return sorted(locks.values(), key=id)
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.start_time if self.start_time is not None else 0.0
+
+    async def acquire_all(self, acquire: Optional[Callable[["Transaction", asyncio.Lock], Awaitable]] = None):
+        # Timing starts when the transaction starts taking locks
+        self.start_time = time.time()
+        for lock in self.lock_order():
+            if acquire is None:
+                await lock.acquire()
+            else:
+                await acquire(self, lock)
             self.locks.append(lock)
-            await lock.acquire()
-            self.logger.info(f"Transaction {self.id}: Added operation")
-        except Exception as e:
-            raise TransactionException(f"Failed to add operation to transaction {self.id}: {str(e)}")
+            if self.wounded:
+                raise TransactionAbortedError(f"Transaction {self.id} wounded by an older transaction")
+
+    async def execute(self, release: Optional[Callable[[asyncio.Lock], None]] = None, concurrent: bool = False):
+        early = self._early_releases() if self.independent_steps else None
+        if concurrent and len(self.steps) > 1:
+            groups = self._lock_groups()
+            if len(groups) > 1:
+                # Let every group finish before reporting a failure, so rollback
+                # never runs while another group is still executing
+                results = await asyncio.gather(*(self._run_group(group, early, release) for group in groups),
+                                               return_exceptions=True)
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+                _LOG.info("Transaction %s: Executed all operations", self.id)
+                return
+        await self._run_group(range(len(self.steps)), early, release)
+        _LOG.info("Transaction %s: Executed all operations", self.id)
+
+    def _lock_groups(self) -> List[List[int]]:
+        # Steps that share a lock stay in one group and keep their relative
+        # order; steps without a lock are kept together in one group as well.
+        # Each step names at most one lock, so grouping by lock gives the
+        # connected components of the shares-a-lock relation directly.
+        groups: Dict[Optional[int], List[int]] = {}
+        for index, (_, _, lock) in enumerate(self.steps):
+            groups.setdefault(id(lock) if lock is not None else None, []).append(index)
+        return list(groups.values())
 
-    async def execute(self):
-        for operation in self.operations:
+    async def _run_group(self, indexes: Iterable[int], early: Optional[Dict[int, asyncio.Lock]],
+                         release: Optional[Callable[[asyncio.Lock], None]]):
+        steps = self.steps
+        for index in indexes:
+            if self.wounded:
+                raise TransactionAbortedError(f"Transaction {self.id} wounded by an older transaction")
             try:
-                await operation()
+                self.started.append(index)
+                await steps[index][0]()
             except Exception as e:
-                raise TransactionAbortedError(f"Operation failed in transaction {self.id}: {str(e)}")
-        self.logger.info(f"Transaction {self.id}: Executed all operations")
+                raise TransactionAbortedError(f"Operation failed in transaction {self.id}: {str(e)}") from e
+            if early and index in early:
+                lock = early[index]
+                self.locks.remove(lock)
+                if release is None:
+                    lock.release()
+                else:
+                    release(lock)
 
     async def rollback(self):
-        for rollback_operation in reversed(self.rollback_operations):
+        # Only operations that were started need undoing
+        steps = self.steps
+        for index in sorted(self.started, reverse=True):
             try:
-                await rollback_operation()
+                await steps[index][1]()
             except Exception as e:
-                self.logger.error(f"Rollback operation failed in transaction {self.id}: {str(e)}")
-        self.logger.info(f"Transaction {self.id}: Rolled back all operations")
+                _LOG.error("Rollback operation failed in transaction %s: %s", self.id, e)
+        _LOG.info("Transaction %s: Rolled back all operations", self.id)
 
     def release_locks(self):
         for lock in self.locks:
             lock.release()
-        self.logger.info(f"Transaction {self.id}: Released all locks")
+        self.locks.clear()
+        _LOG.info("Transaction %s: Released all locks", self.id)
+
+_current_transaction: ContextVar[Optional[Transaction]] = ContextVar('current_transaction', default=None)
+
+def current_transaction() -> Optional[Transaction]:
+    return _current_transaction.get()
 
 class TransactionManager:
-    def __init__(self, timeout: float = 5.0):
-        self.lock = asyncio.Lock()
-        self.transactions: Dict[int, Transaction] = {}
-        self.next_transaction_id = 1
-        self.timeout = timeout
-        self.logger = Logger.get_logger()
-
-    async def start_transaction(self) -> Transaction:
-        async with self.lock:
+    INITIAL_SLOTS = 1024
+
+    __slots__ = ('_slots', '_free', '_next_id', '_waiting', '_wounds', '_lock_owner', '_unlock_queue',
+                 '_unlock_task', 'logger')
+
+    def __init__(self):
+        # Live transactions sit in a slot list; finished transactions return
+        # their slot to the free list for reuse
+        self._slots: List[Optional[Transaction]] = [None] * self.INITIAL_SLOTS
+        self._free: List[int] = list(range(self.INITIAL_SLOTS - 1, -1, -1))
+        self._next_id = itertools.count(1).__next__
+        # Blocked transaction id -> its pending acquire, so a wound can cancel it
+        self._waiting: Dict[int, asyncio.Future] = {}
+        # Blocked transactions whose acquire was cancelled by a wound
+        self._wounds: Set[int] = set()
+        self._lock_owner: Dict[int, Transaction] = {}
+        self._unlock_queue: Optional[asyncio.Queue] = None
+        self._unlock_task: Optional[asyncio.Task] = None
+        self.logger = _LOG
+
+    def _ensure_unlock_worker(self):
+        # Started lazily so the manager can be constructed outside a running loop.
+        if self._unlock_task is None:
+            self._unlock_queue = asyncio.Queue()
+            self._unlock_task = asyncio.create_task(self._unlock_worker())
+
+    async def _unlock_worker(self):
+        queue = self._unlock_queue
+        while True:
+            batches = [await queue.get()]
+            while not queue.empty():
+                batches.append(queue.get_nowait())
+            for locks in batches:
+                for lock in locks:
+                    self._lock_owner.pop(id(lock), None)
+                    lock.release()
+                queue.task_done()
+
+    async def close(self):
+        # Stops the unlock worker once committed locks are all released; it
+        # starts again lazily, on the running loop, if the manager is reused.
+        if self._unlock_task is not None:
+            await self._unlock_queue.join()
+            self._unlock_task.cancel()
             try:
-                transaction_id = self.next_transaction_id
-                self.next_transaction_id += 1
-                transaction = Transaction(transaction_id)
-                self.transactions[transaction_id] = transaction
-                self.logger.info(f"Started transaction {transaction_id}")
-                return transaction
-            except Exception as e:
-                raise TransactionException(f"Failed to start transaction: {str(e)}")
+                await self._unlock_task
+            except asyncio.CancelledError:
+                pass
+            self._unlock_task = None
+            self._unlock_queue = None
+        self.logger.info("Transaction manager closed")
+
+    async def start_transaction(self, n_ops: int = 0) -> Transaction:
+        # Nothing here awaits, so handing out ids needs no lock
+        transaction_id = self._next_id()
+        transaction = Transaction(transaction_id, n_ops)
+        if self._free:
+            transaction.slot = self._free.pop()
+            self._slots[transaction.slot] = transaction
+        else:
+            transaction.slot = len(self._slots)
+            self._slots.append(transaction)
+        self.logger.info("Started transaction %s", transaction_id)
+        return transaction
 
-    async def run_transaction(self, transaction: Transaction):
+    @asynccontextmanager
+    async def transaction(self, n_ops: int = 0, concurrent: bool = False) -> AsyncIterator[Transaction]:
+        # Scoped transactions belong to the task that opened them, so they are
+        # not entered in the registry. Operations added inside the block run
+        # when it exits; if the block raises, nothing has run and nothing is
+        # committed. A nested scope joins the transaction already in progress.
+        current = _current_transaction.get()
+        if current is not None:
+            yield current
+            return
+
+        transaction = Transaction(self._next_id(), n_ops)
+        token = _current_transaction.set(transaction)
         try:
-            await asyncio.wait_for(self._run_transaction(transaction), timeout=self.timeout)
-        except asyncio.TimeoutError:
-            await self._handle_deadlock(transaction)
+            yield transaction
+        finally:
+            _current_transaction.reset(token)
+        await self.run_transaction(transaction, concurrent)
+
+    @property
+    def transactions(self) -> Dict[int, Transaction]:
+        return {transaction.id: transaction for transaction in self._slots if transaction is not None}
+
+    def _unregister(self, transaction: Transaction):
+        if transaction.slot < 0:
+            return
+        self._slots[transaction.slot] = None
+        self._free.append(transaction.slot)
+        transaction.slot = -1
+
+    async def run_single(self, operation: Callable, rollback: Callable, lock: asyncio.Lock) -> Any:
+        # A single operation under a single lock cannot take part in a deadlock
+        # or need wounding, so it skips the Transaction object and the registry.
+        await lock.acquire()
+        try:
+            return await operation()
         except Exception as e:
-            raise TransactionException(f"Failed to run transaction {transaction.id}: {str(e)}")
+            self.logger.error("Error in single-operation transaction: %s", e)
+            try:
+                await rollback()
+            except Exception as rollback_error:
+                self.logger.error("Rollback operation failed in single-operation transaction: %s", rollback_error)
+            raise TransactionAbortedError(f"Single-operation transaction aborted: {str(e)}") from e
+        finally:
+            lock.release()
 
-    async def _run_transaction(self, transaction: Transaction):
+    async def run_transaction(self, transaction: Transaction, concurrent: bool = False):
+        # concurrent=True runs groups of steps with disjoint locks in parallel
         try:
-            await transaction.execute()
+            await transaction.acquire_all(self._acquire)
+            await transaction.execute(self._release_lock, concurrent)
             self._commit_transaction(transaction)
         except Exception as e:
-            self.logger.error(f"Error in transaction {transaction.id}: {str(e)}")
+            self.logger.error("Error in transaction %s: %s", transaction.id, e)
             await self._rollback_transaction(transaction)
-            raise TransactionAbortedError(f"Transaction {transaction.id} aborted: {str(e)}")
+            raise TransactionAbortedError(f"Transaction {transaction.id} aborted: {str(e)}") from e
+        except BaseException:
+            # A cancelled transaction still has to undo what ran and give back
+            # its locks and registry slot
+            self.logger.warning("Transaction %s cancelled", transaction.id)
+            await self._rollback_transaction(transaction)
+            raise
 
-    def _commit_transaction(self, transaction: Transaction):
-        try:
-            transaction.release_locks()
-            del self.transactions[transaction.id]
-            self.logger.info(f"Committed transaction {transaction.id}")
-        except Exception as e:
-            raise TransactionException(f"Failed to commit transaction {transaction.id}: {str(e)}")
+    async def _acquire(self, transaction: Transaction, lock: asyncio.Lock):
+        if not lock.locked():
+            await lock.acquire()
+            self._lock_owner[id(lock)] = transaction
+            return
 
-    async def _rollback_transaction(self, transaction: Transaction):
-        try:
-            await transaction.rollback()
-            transaction.release_locks()
-            del self.transactions[transaction.id]
-            self.logger.info(f"Rolled back transaction {transaction.id}")
-        except Exception as e:
-            raise TransactionException(f"Failed to rollback transaction {transaction.id}: {str(e)}")
+        # Wound-wait: an older transaction never waits behind a younger one; it
+        # wounds the holder, which aborts and releases, and only then takes over.
+        # Locks are always taken in lock_order(), so waits can never form a
+        # cycle and no deadlock detection is needed on top of this.
+        owner = self._lock_owner.get(id(lock))
+        if owner is not None and owner.id > transaction.id:
+            self._wound(owner)
+        if transaction.wounded:
+            raise TransactionAbortedError(f"Transaction {transaction.id} wounded by an older transaction")
 
-    async def _handle_deadlock(self, transaction: Transaction):
+        acquiring = asyncio.ensure_future(lock.acquire())
+        self._waiting[transaction.id] = acquiring
         try:
-            await self._rollback_transaction(transaction)
-            self.logger.warning(f"Deadlock detected in transaction {transaction.id}")
-            raise DeadlockDetectedError(f"Transaction {transaction.id} aborted due to potential deadlock")
-        except Exception as e:
-            raise TransactionException(f"Failed to handle deadlock for transaction {transaction.id}: {str(e)}")
+            try:
+                await acquiring
+            except asyncio.CancelledError:
+                if transaction.id in self._wounds:
+                    raise TransactionAbortedError(f"Transaction {transaction.id} wounded by an older transaction")
+                raise
+        except BaseException:
+            if acquiring.done() and not acquiring.cancelled() and acquiring.exception() is None:
+                lock.release()
+            else:
+                acquiring.cancel()
+            raise
+        finally:
+            self._waiting.pop(transaction.id, None)
+            self._wounds.discard(transaction.id)
+        self._lock_owner[id(lock)] = transaction
+
+    def _wound(self, transaction: Transaction):
+        # A wounded transaction aborts at its next check; one that is blocked
+        # is woken now, since the lock it waits for may be held up behind us
+        transaction.wounded = True
+        acquiring = self._waiting.pop(transaction.id, None)
+        if acquiring is not None:
+            self._wounds.add(transaction.id)
+            acquiring.cancel()
+
+    def _release_lock(self, lock: asyncio.Lock):
+        self._lock_owner.pop(id(lock), None)
+        lock.release()
+
+    def _release_locks(self, transaction: Transaction):
+        for lock in transaction.locks:
+            self._lock_owner.pop(id(lock), None)
+        transaction.release_locks()
+
+    def _commit_transaction(self, transaction: Transaction):
+        # Committed locks are handed to the unlock worker so the caller
+        # returns without releasing them one by one
+        if transaction.locks:
+            self._ensure_unlock_worker()
+            self._unlock_queue.put_nowait(transaction.locks)
+            transaction.locks = []
+        self._unregister(transaction)
+        self.logger.info("Committed transaction %s", transaction.id)
+
+    async def _rollback_transaction(self, transaction: Transaction):
+        # Transaction.rollback already logs and skips failing rollback steps
+        await transaction.rollback()
+        self._release_locks(transaction)
+        self._unregister(transaction)
+        self.logger.info("Rolled back transaction %s", transaction.id)
@@ -1,12 +1,14 @@
-from enum import Enum
-from typing import NamedTuple, Dict, Any, Optional
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Dict, Any, Optional
 
-class OperationType(Enum):
+class OperationType(IntEnum):
     ADD = 1
     UPDATE = 2
     DELETE = 3
 
-class Operation(NamedTuple):
+@dataclass(frozen=True, slots=True)
+class Operation:
     type: OperationType
     collection_id: int
     doc_id: Optional[int]